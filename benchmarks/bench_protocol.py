@@ -0,0 +1,222 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Hot paths micro-benchmarks
+
+Runs without hardware.
+
+How to use:
+PYTHONPATH=src python benchmarks/bench_protocol.py [--baseline benchmarks/baseline.json] [--save-baseline] [--only NAME]
+Prints results as JSON. Exits with 1 when a benchmark is slower than the baseline beyond the tolerance.
+
+Timings depend on the machine so no baseline is shipped: record one on yours, before changing the code, with
+--save-baseline. It is ignored by git. A baseline is only compared against on the host it was recorded on.
+The metrics overhead is the slowdown of the I/O benchmarks when enabling metrics, which are disabled by default.
+The simulated device answers in microseconds where hardware takes longer: these are upper bounds of the overhead.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable
+
+from tc2290 import TC2290
+from tc2290.metrics import Metrics
+from tc2290.protocol import Address, Chunk, Command, Data, Decoder, Frame, Header, Message
+from tc2290.simulator import SimulatedTC2290
+from tc2290.surface import Digit, Surface
+
+BASELINE = Path(__file__).with_name('baseline.json')
+
+BUTTON_REPORT = bytes.fromhex('0c080000ffffffff78000000') + bytes(52)
+
+
+def bench_message_encode() -> Callable[[], object]:
+    def run():
+        return bytes(Message(Header(Command.WRITE_REG, address=0x4B), Data([Chunk([0xFF] * Chunk.SIZE)] * 4)))
+
+    return run
+
+
+def bench_frame_encode() -> Callable[[], object]:
+    words = [0xFF] * 4
+
+    def run():
+        return Frame.from_words(Command.WRITE_REG, 0x4B, words).report
+
+    return run
+
+
+def bench_report_decode() -> Callable[[], object]:
+    decoder = Decoder()
+    report = list(BUTTON_REPORT)  # As returned by hidapi
+
+    def run():
+        return decoder.decode(report)
+
+    return run
+
+
+def bench_surface_flush() -> Callable[[], object]:
+    surface = Surface()
+
+    def run():
+        surface.invalidate()
+        return surface.flush()
+
+    return run
+
+
+def bench_surface_send(metrics: Metrics | None = None) -> Callable[[], object]:
+    tc = TC2290(transport=SimulatedTC2290(), metrics=metrics)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    def run():
+        tc.surface.invalidate()
+        tc.flush()
+
+    return run
+
+
+def bench_poll_empty(metrics: Metrics | None = None) -> Callable[[], object]:
+    tc = TC2290(transport=SimulatedTC2290(), metrics=metrics)
+    return tc.poll
+
+
+def bench_digit_from_str() -> Callable[[], object]:
+    digit = Digit(Address.DELAY__DIGIT_1)
+
+    def run():
+        digit.from_str('5.')
+
+    return run
+
+
+def bench_digit_to_str() -> Callable[[], object]:
+    digit = Digit(Address.DELAY__DIGIT_1)
+    digit.from_str('5.')
+
+    def run():
+        return digit.to_str()
+
+    return run
+
+
+def bench_surface_init() -> Callable[[], object]:
+    return Surface
+
+
+BENCHMARKS = {
+    name[len('bench_'):]: function
+    for name, function in sorted(globals().items())
+    if name.startswith('bench_')
+}
+
+
+def measure(setup: Callable[[], Callable[[], object]], repeat: int = 5) -> float:
+    """
+    Best of repeat runs, in operations per second
+    """
+    timer = timeit.Timer(setup())
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return number / best
+
+
+# Benchmarks run again to measure the metrics overhead
+METERED = ('surface_send', 'poll_empty')
+
+
+def overhead(setup: Callable[[Metrics], Callable[[], object]], rounds: int = 60) -> float:
+    """
+    Slowdown ratio with metrics enabled against disabled
+
+    Both run on the same instance, alternately and in turns first so that neither the machine load nor the order
+    favors one. The median of the paired ratios is kept.
+    """
+    metrics = Metrics()
+    timer = timeit.Timer(setup(metrics))
+    number = max(timer.autorange()[0] // 10, 1)
+    ratios = []
+    for turn in range(rounds):
+        times = {}
+        for enabled in (True, False) if turn % 2 else (False, True):
+            metrics.enabled = enabled
+            times[enabled] = timer.timeit(number)
+        ratios.append(times[True] / times[False])
+    return statistics.median(ratios) - 1
+
+
+def host() -> dict[str, object]:
+    """
+    What the results depend on besides the code
+    """
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'node': platform.node(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(output: dict, path: Path, tolerance: float) -> dict[str, float]:
+    """
+    Adds the ratios to the baseline results to output
+
+    :return: Benchmarks slower than the baseline beyond the tolerance
+    """
+    if not path.exists():
+        logging.warning("No baseline at %s, not comparing. Record one with --save-baseline.", path)
+        return {}
+    baseline = json.loads(path.read_text())
+    if baseline.get('host') != output['host']:
+        logging.warning("%s was recorded on another host, not comparing. Record one with --save-baseline.", path)
+        return {}
+    ratios = {
+        name: value / baseline['results'][name] for name, value in output['results'].items()
+        if name in baseline['results']
+    }
+    output['ratios'] = ratios
+    output['regressions'] = {name: ratio for name, ratio in ratios.items() if ratio < 1 - tolerance}
+    return output['regressions']
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="accepted slowdown ratio")
+    parser.add_argument('--only', action='append', choices=list(BENCHMARKS), help="run only this benchmark")
+    args = parser.parse_args()
+
+    results = {name: measure(BENCHMARKS[name]) for name in (args.only or BENCHMARKS)}
+    output = {
+        'host': host(),
+        'unit': 'ops/s',
+        'results': results,
+    }
+    overheads = {name: overhead(BENCHMARKS[name]) for name in METERED if name in results}
+    if overheads:
+        output['metrics_overhead'] = overheads
+
+    regressions = {} if args.save_baseline else compare(output, args.baseline, args.tolerance)
+    print(json.dumps(output, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(output, indent=2) + '\n')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,7 +13,7 @@
 # NOTE:: req max 1026 but got 18
 # NOTE:: req max 1026 but got 14
 import time
-from tc2290.replayer import interruptRead, interruptWrite, validate_read
+from tc2290.replayer import interruptRead, interruptWrite, validate_read, validator
 
 
 # Generated from packet 31/32
@@ -282,6 +282,7 @@ validate_read(b"\x01\x2D\x00\x00\x01\x00\x00\x00\x55\x6E\x6E\x61\x6D\x65\x64\x20
 time.sleep(2.161)
 # Generated from packet 153/154
 interruptWrite(0x02, b"")
+print(validator.summary())
 # WARNING: 2 pending complete requests
 # PcapGen: generated 155 packets
 # PcapGen device filter: dropped 0 / 155 packets
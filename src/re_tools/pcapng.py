@@ -0,0 +1,149 @@
+"""
+Streaming pcapng reader for USBPcap captures
+
+How to use:
+python pcapng.py ../../capture/ORIG.pcapng
+Prints every HID report with its timestamp, direction and endpoint.
+No need to export to text from Wireshark anymore.
+"""
+
+import mmap
+import struct
+import sys
+from enum import Enum
+from typing import Iterator, NamedTuple
+
+LINKTYPE_USBPCAP = 249
+
+# Block types
+_SECTION_HEADER = 0x0A0D0D0A
+_INTERFACE_DESCRIPTION = 0x00000001
+_SIMPLE_PACKET = 0x00000003
+_ENHANCED_PACKET = 0x00000006
+
+_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+_OPTION_IF_TSRESOL = 9
+
+# USBPcap packet header
+# headerLen, irpId, status, function, info, bus, device, endpoint, transfer, dataLength
+_USBPCAP_HEADER = struct.Struct('<HQIHBHHBBI')
+_USBPCAP_TRANSFER_INTERRUPT = 0x01
+_USBPCAP_ENDPOINT_IN = 0x80
+
+
+class Direction(Enum):
+    OUT = 'out'  # Host -> Device
+    IN = 'in'  # Device -> Host
+
+
+class Record(NamedTuple):
+    timestamp: float  # Seconds since epoch
+    direction: Direction
+    endpoint: int
+    data: bytes
+
+
+class PcapngError(ValueError):
+    pass
+
+
+def _options(buffer, offset: int, end: int, endian: str) -> Iterator[tuple[int, bytes]]:
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(endian + 'HH', buffer, offset)
+        if code == 0:  # opt_endofopt
+            return
+        yield code, buffer[offset + 4:offset + 4 + length]
+        offset += 4 + length + (-length % 4)
+
+
+def _resolution(value: int) -> float:
+    if value & 0x80:
+        return 2.0 ** -(value & 0x7F)
+    return 10.0 ** -value
+
+
+def records(buffer) -> Iterator[Record]:
+    """
+    Interrupt transfers carrying data from a pcapng buffer (bytes, mmap…)
+    """
+    size = len(buffer)
+    offset = 0
+    endian = '<'
+    interfaces: list[tuple[int, float]] = []  # Link type and timestamp resolution per interface
+    while offset + 12 <= size:
+        block_type, = struct.unpack_from('<I', buffer, offset)
+        if block_type == _SECTION_HEADER:
+            magic, = struct.unpack_from('<I', buffer, offset + 8)
+            if magic == _BYTE_ORDER_MAGIC:
+                endian = '<'
+            elif magic == int.from_bytes(_BYTE_ORDER_MAGIC.to_bytes(4, 'little'), 'big'):
+                endian = '>'
+            else:
+                raise PcapngError(f"invalid byte order magic at offset {offset}")
+            interfaces = []  # Interfaces are scoped by section
+        block_type, block_length = struct.unpack_from(endian + 'II', buffer, offset)
+        if block_length < 12 or offset + block_length > size:
+            raise PcapngError(f"truncated block at offset {offset}")
+        body = offset + 8
+        end = offset + block_length - 4
+
+        if block_type == _INTERFACE_DESCRIPTION:
+            link_type, = struct.unpack_from(endian + 'H', buffer, body)
+            resolution = 1e-6
+            for code, value in _options(buffer, body + 8, end, endian):
+                if code == _OPTION_IF_TSRESOL:
+                    resolution = _resolution(value[0])
+            interfaces.append((link_type, resolution))
+
+        elif block_type == _ENHANCED_PACKET:
+            interface, high, low, captured = struct.unpack_from(endian + 'IIII', buffer, body)
+            link_type, resolution = interfaces[interface]
+            if link_type == LINKTYPE_USBPCAP:
+                record = _usbpcap(buffer, body + 20, captured, ((high << 32) | low) * resolution)
+                if record:
+                    yield record
+
+        elif block_type == _SIMPLE_PACKET:
+            # No timestamp and always the first interface
+            link_type, _ = interfaces[0]
+            if link_type == LINKTYPE_USBPCAP:
+                captured = min(struct.unpack_from(endian + 'I', buffer, body)[0], end - body - 4)
+                record = _usbpcap(buffer, body + 4, captured, 0.0)
+                if record:
+                    yield record
+
+        offset += block_length
+
+
+def _usbpcap(buffer, offset: int, captured: int, timestamp: float) -> Record | None:
+    if captured < _USBPCAP_HEADER.size:
+        return None
+    (
+        header_length, _irp, _status, _function, _info, _bus, _device, endpoint, transfer, data_length,
+    ) = _USBPCAP_HEADER.unpack_from(buffer, offset)
+    if transfer != _USBPCAP_TRANSFER_INTERRUPT or not data_length:
+        return None
+    start = offset + header_length
+    data_length = min(data_length, captured - header_length)
+    return Record(
+        timestamp=timestamp,
+        direction=Direction.IN if endpoint & _USBPCAP_ENDPOINT_IN else Direction.OUT,
+        endpoint=endpoint,
+        data=bytes(buffer[start:start + data_length]),
+    )
+
+
+def read(path: str) -> Iterator[Record]:
+    """
+    Interrupt transfers carrying data from a pcapng file
+
+    The file is memory mapped so that captures of any size are processed lazily.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        yield from records(buffer)
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        for record in read(path):
+            print(f"{record.timestamp:.6f} {record.direction.value:>3} 0x{record.endpoint:02X} {record.data.hex()}")
@@ -0,0 +1,26 @@
+"""
+How to use:
+Record with TC2290(trace=Trace('session.trace'))
+python render_trace.py session.trace [--decode]
+Prints every report with its timestamp and direction, as hex or as decoded events.
+"""
+
+import argparse
+from datetime import datetime
+
+from tc2290.protocol import Decoder
+from tc2290.trace import Direction, read
+
+parser = argparse.ArgumentParser(description="Renders a TC2290 binary trace")
+parser.add_argument('trace')
+parser.add_argument('--decode', action='store_true', help="decode the reports from the device")
+args = parser.parse_args()
+
+decoder = Decoder()
+for record in read(args.trace):
+    timestamp = datetime.fromtimestamp(record.timestamp).isoformat(timespec='microseconds')
+    arrow = '->' if record.direction is Direction.OUT else '<-'
+    if args.decode and record.direction is Direction.IN and record.data:
+        print(f"{timestamp} {arrow} {decoder.decode(record.data)!r}")
+    else:
+        print(f"{timestamp} {arrow} {record.data.hex(' ')}")
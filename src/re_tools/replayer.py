@@ -1,22 +1,53 @@
 """
 How to use:
-From wireshark export to text
-grep only "HID Data" messages
+Record a capture with USBPcap (Wireshark)
+python replayer.py ../../capture/ORIG.pcapng [--speed N | --batch | --step] [--validate]
 Profit!
 """
 
+import argparse
 import logging
-from binascii import unhexlify
+import time
 
+from re_tools.pcapng import Direction, read
 from tc2290 import TC2290
+from tc2290.replayer import Replayer
+from tc2290.validation import validate
 
 logging.basicConfig(level=logging.INFO)
 
-tc = TC2290()
+parser = argparse.ArgumentParser(description="Replays the host to device reports of a capture")
+parser.add_argument('capture', nargs='?', default='../../capture/ORIG.pcapng')
+mode = parser.add_mutually_exclusive_group()
+mode.add_argument('--speed', type=float, default=1.0, help="time multiplier")
+mode.add_argument('--batch', action='store_true', help="as fast as the device accepts")
+mode.add_argument('--step', action='store_true', help="wait for enter before each report")
+parser.add_argument('--validate', action='store_true', help="compare the reports read to the captured ones")
+args = parser.parse_args()
 
-with open('../../capture/ORIG_HID.txt') as f:
-    for line in f:
-        data = list(unhexlify(line[10:-4]))  # Omit HID Data: and weird chars after the data
+reads = []
+tc = TC2290(receive_callback=reads.append if args.validate else None)
+
+if args.step:
+    for record in read(args.capture):
+        if record.direction is not Direction.OUT:
+            continue
         input()
-        tc.send(data)
-        logging.info(line)
+        tc.send(record.data)
+        logging.info(record.data.hex())
+else:
+    if args.validate:
+        tc.start()
+    replayer = Replayer(tc.send, speed=None if args.batch else args.speed)
+    stats = replayer.replay(
+        (record.timestamp, record.data) for record in read(args.capture) if record.direction is Direction.OUT
+    )
+    logging.info(
+        f"{stats.packets} packets in {stats.duration:.3f} s: {stats.rate:.1f} packets/s, "
+        f"lateness mean {stats.lateness_mean * 1e3:.3f} ms, max {stats.lateness_max * 1e3:.3f} ms, "
+        f"jitter {stats.jitter * 1e3:.3f} ms"
+    )
+    if args.validate:
+        time.sleep(1)  # Late replies
+        tc.stop()
+        print(validate((record.data for record in read(args.capture) if record.direction is Direction.IN), reads))
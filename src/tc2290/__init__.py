@@ -7,74 +7,295 @@
 TC2290-DT Reverse engineering trainer
 """
 import logging
+import queue
+import threading
 from binascii import unhexlify
+from dataclasses import dataclass
 from difflib import SequenceMatcher
-from typing import Callable, Optional
+from time import perf_counter_ns
+from typing import Callable, Optional, Protocol
 
 import hid
 
-from tc2290.protocol import Address, Command, Chunk, Data, Header, Message
+from tc2290.metrics import Metrics
+from tc2290.protocol import Address, Command, Data, Decoder, Event, Frame, Header, Message, instance_start
 from tc2290.surface import Surface
+from tc2290.trace import Direction, Recorder
+
+
+class Transport(Protocol):
+    """
+    What TC2290 needs from a device. Implemented by hid.device and SimulatedTC2290.
+    """
+
+    def read(self, max_length: int, timeout_ms: int = 0) -> list[int]:
+        ...
+
+    def write(self, buff) -> int:
+        ...
+
+    def set_nonblocking(self, value: bool | int) -> int:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+@dataclass
+class IOStats:
+    """
+    Threaded I/O mode statistics
+    """
+    read: int = 0  # Reports read from the device
+    delivered: int = 0  # Reports handed over to the callbacks
+    dropped: int = 0  # Reports dropped because the queue was full
+    high_water: int = 0  # Deepest the queue has been
 
 
 class TC2290:
     _VENDOR_ID = 0x1220  # tc-electronic
-    _PRODUCT_ID = 0x0071  # TC 2290
-    #_PRODUCT_ID = 0x0073  # TC 8210
+    _PRODUCT_ID = 0x0071  # TC 2290. See tc2290.manager for the other supported devices.
 
-    _logging: logging
-    _device: hid.device
+    _logging: logging.Logger
+    _trace: Recorder | None
+    _device: Transport | None
     _receive_callback: Callable[[list], None]
+    _event_callback: Callable[[Event], None]
+    _disconnect_callback: Callable[[Exception], None]
+    _decoder: Decoder
+    _queue: queue.SimpleQueue
+    _queue_size: int
+    _running: threading.Event
+    _reader: threading.Thread | None
+    _consumer: threading.Thread | None
 
     surface: Surface
+    stats: IOStats
+    metrics: Metrics
 
-    def __init__(self, receive_callback: Optional[Callable[[list], None]] = None) -> None:
-        self._logging = logging.getLogger()
-        self._logging.setLevel(logging.DEBUG)  # FIXME: remove for production
+    def __init__(
+            self,
+            receive_callback: Optional[Callable[[list], None]] = None,
+            event_callback: Optional[Callable[[Event], None]] = None,
+            transport: Optional[Transport] = None,
+            disconnect_callback: Optional[Callable[[Exception], None]] = None,
+            trace: Optional[Recorder] = None,
+            metrics: Optional[Metrics] = None,
+    ) -> None:
+        """
+        :param transport: Opened device. Defaults to the first TC2290 found by hidapi.
+        :param disconnect_callback: Called from the reader thread when reading fails in threaded I/O mode
+        :param trace: Records every report sent and received. A Trace or a PcapngRecorder.
+        :param metrics: Defaults to disabled metrics. Pass Metrics() or set metrics.enabled to collect them.
+        """
+        self._logging = logging.getLogger(__name__)
+        self._trace = trace
 
         self._receive_callback = receive_callback
+        self._event_callback = event_callback
+        self._disconnect_callback = disconnect_callback
+        self._decoder = Decoder()
 
-        self._device = hid.device()
-        self._device.open(self._VENDOR_ID, self._PRODUCT_ID)
+        self._queue = queue.SimpleQueue()
+        self._queue_size = 0
+        self._running = threading.Event()
+        self._reader = None
+        self._consumer = None
+        self.stats = IOStats()
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.metrics.gauge('read_queue_depth', self._queue.qsize)
+        self.metrics.gauge('read_queue_high_water', lambda: self.stats.high_water)
+        self.metrics.gauge('read_queue_dropped', lambda: self.stats.dropped)
+
+        if transport is None:
+            transport = hid.device()
+            transport.open(self._VENDOR_ID, self._PRODUCT_ID)
+        self._device = transport
         self._device.set_nonblocking(True)  # Allows polling in an infinite loop
 
         self.surface = Surface()
 
     def __del__(self) -> None:
-        self.send(Message(Header(Command.INSTANCE_STOP)))
-        self._device.close()
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the threaded I/O mode, unregisters the instance and releases the device
+        """
+        if getattr(self, '_device', None) is None:  # Closed or failed to open
+            return
+        self.stop()
+        try:
+            self.send(Frame(Command.INSTANCE_STOP, data=b''))  # As captured
+        except (OSError, ValueError):
+            pass  # Unplugged
+        finally:
+            device, self._device = self._device, None  # Closed once, even if closing fails
+            device.close()
 
-    def _read(self) -> list | None:
-        data = self._device.read(Message.MAX_SIZE)
+    def _read(self, timeout_ms: int = 0) -> list | None:
+        metrics = self.metrics
+        if metrics.enabled and not timeout_ms:  # Blocking reads measure the device, not the call
+            if next(metrics.polls) % metrics.sample:
+                data = self._device.read(Message.MAX_SIZE, timeout_ms)
+            else:
+                start = perf_counter_ns()
+                data = self._device.read(Message.MAX_SIZE, timeout_ms)
+                metrics.hid_read.observe(perf_counter_ns() - start)
+            if data:
+                next(metrics.data_polls)
+        else:
+            data = self._device.read(Message.MAX_SIZE, timeout_ms)
         if data:
-            logging.debug(f"<- {bytes(data).hex(' ')}")
+            if metrics.enabled:
+                next(metrics.reports_read)
+            self._received(data)
             # TODO: update local model
         return data
 
-    def _write(self, data: list) -> None:
+    def _received(self, data: list) -> None:
+        if self._trace is not None:
+            self._trace.record(Direction.IN, data)
+        if self._logging.isEnabledFor(logging.DEBUG):
+            self._logging.debug("<- %s", bytes(data).hex(' '))
+
+    def _write(self, report: bytes | memoryview, timed: bool = False) -> None:
         # TODO: update local model
-        self._device.write(data)
+        if not timed:
+            self._device.write(report)
+            return
+        start = perf_counter_ns()
+        self._device.write(report)
+        self.metrics.hid_write.observe(perf_counter_ns() - start)
+
+    def _dispatch(self, data: list) -> None:
+        if self._receive_callback:
+            self._receive_callback(data)
+        if self._event_callback:
+            metrics = self.metrics
+            if not metrics.enabled or next(metrics.reports_decoded) % metrics.sample:
+                self._event_callback(self._decoder.decode(data))
+                return
+            start = perf_counter_ns()
+            event = self._decoder.decode(data)
+            metrics.decode.observe(perf_counter_ns() - start)
+            self._event_callback(event)
+
+    def read(self, timeout_ms: int = 0) -> list | None:
+        """
+        Reads a single report, waiting up to timeout_ms for it
+
+        Bypasses the callbacks. Not to be used along the threaded I/O mode.
+        """
+        return self._read(timeout_ms)
 
     def poll(self) -> None:
         data = self._read()
         if data:
-            logging.debug(f"<- {bytes(data).hex(' ')}")
-            if self._receive_callback:
-                self._receive_callback(data)
+            self._dispatch(data)
+
+    def start(self, queue_size: int = 1024, timeout_ms: int = 100) -> None:
+        """
+        Threaded I/O mode
+
+        A reader thread blocks on the device and queues reports.
+        A consumer thread delivers them to the callbacks.
+        Reports arriving while the queue is full are dropped and counted in stats.
 
-    def send(self, data: Message) -> None:
-        logging.debug(f"-> {bytes(data).hex(' ')}")
-        self._write([0x00, *data])
+        :param queue_size: Maximum number of reports waiting for the consumer
+        :param timeout_ms: Read timeout. Bounds how long stop() waits for the reader.
+        """
+        if self._running.is_set():
+            raise RuntimeError("already started")
+        self._queue_size = queue_size
+        self._running.set()
+        self._reader = threading.Thread(target=self._read_loop, args=(timeout_ms,), name='TC2290 reader', daemon=True)
+        self._consumer = threading.Thread(target=self._consume_loop, name='TC2290 consumer', daemon=True)
+        self._consumer.start()
+        self._reader.start()
+
+    def stop(self) -> None:
+        """
+        Stops the threaded I/O mode once the queued reports have been delivered
+        """
+        self._running.clear()
+        for thread in (self._reader, self._consumer):
+            if thread is not None and thread is not threading.current_thread():
+                thread.join()
+        self._reader = None
+        self._consumer = None
+
+    def join(self, timeout: float | None = None) -> None:
+        """
+        Waits for the threaded I/O mode to end
+        """
+        if self._consumer is not None:
+            self._consumer.join(timeout)
+
+    def _read_loop(self, timeout_ms: int) -> None:
+        read = self._device.read
+        put = self._queue.put
+        qsize = self._queue.qsize
+        stats = self.stats
+        metrics = self.metrics
+        failure = None
+        try:
+            while self._running.is_set():
+                data = read(Message.MAX_SIZE, timeout_ms)
+                if not data:
+                    continue
+                stats.read += 1
+                if metrics.enabled:
+                    next(metrics.reports_read)
+                self._received(data)
+                depth = qsize()
+                if depth >= self._queue_size:
+                    stats.dropped += 1
+                    continue
+                if depth >= stats.high_water:
+                    stats.high_water = depth + 1
+                put(data)
+        except (OSError, ValueError) as error:
+            self._logging.exception("Reading from the device failed")
+            failure = error
+        finally:
+            put(None)  # Wakes up the consumer
+        # Once the consumer is woken up so that the callback can stop() or close()
+        if failure is not None and self._disconnect_callback:
+            self._disconnect_callback(failure)
+
+    def _consume_loop(self) -> None:
+        get = self._queue.get
+        stats = self.stats
+        while (data := get()) is not None:
+            self._dispatch(data)
+            stats.delivered += 1
+
+    def send(self, data: Frame | Message | list) -> None:
+        metrics = self.metrics
+        timed = metrics.enabled and not next(metrics.reports_written) % metrics.sample
+        if not isinstance(data, Frame):
+            if timed:
+                start = perf_counter_ns()
+                data = Frame.from_bytes(bytes(data))
+                metrics.encode.observe(perf_counter_ns() - start)
+            else:
+                data = Frame.from_bytes(bytes(data))
+        if self._trace is not None:
+            self._trace.record(Direction.OUT, data.report[1:])  # Without the report ID
+        if self._logging.isEnabledFor(logging.DEBUG):
+            self._logging.debug("-> %s", bytes(data).hex(' '))
+        self._write(data.report, timed)
 
     def send_line(self, line: str) -> None:
         size = int(len(line) / 2)  # Hex representation uses 2 characters per byte
         if size > Message.MAX_SIZE:
             raise ValueError(f'Line is too long: {size} > {Message.MAX_SIZE}')
         del size
-        self.send(Message(list(unhexlify(line))))
+        self.send(Frame.from_bytes(unhexlify(line)))
 
     def wakeup(self) -> None:
-        self.send(Message(Header(Command.INSTANCE_START)))
+        self.send(Frame(Command.INSTANCE_START))
 
     @staticmethod
     def address(data: list) -> str:
@@ -95,10 +316,7 @@ class TC2290:
                 Address(0x6D),
                 Data.MAX_CHUNKS,
         ):
-            header = Header(Command.WRITE_REG, address=addr)
-            data = Data([Chunk([0xFF] * Chunk.SIZE)] * Data.MAX_CHUNKS)
-            message = Message(header, data)
-            self.send(message)
+            self.send(Frame.from_words(Command.WRITE_REG, addr, [0xFFFFFFFF] * Data.MAX_CHUNKS))
 
     def none(self):
         """
@@ -109,15 +327,19 @@ class TC2290:
                 Address(0x6D),
                 Data.MAX_CHUNKS,
         ):
-            header = Header(Command.WRITE_REG, address=addr)
-            data = Data([Chunk([0x00] * Chunk.SIZE)] * Data.MAX_CHUNKS)
-            message = Message(header, data)
-            self.send(message)
+            self.send(Frame.from_words(Command.WRITE_REG, addr, [0x00000000] * Data.MAX_CHUNKS))
+
+    def flush(self) -> None:
+        """
+        Writes the surface registers that changed since the last flush
+        """
+        for frame in self.surface.flush():
+            self.send(frame)
 
     def fw_ver(self) -> str:
         # FIXME: separate query from reply
         self._device.set_nonblocking(False)
-        self.send(Message(Header(Command.READ_REG, address=0x02)))
+        self.send(Frame(Command.READ_REG, address=Address.VERSION))
         version = bytes(self._read())[Header.SIZE:-1].decode('ASCII').rstrip('\x00')
         self._device.set_nonblocking(True)
         return version
@@ -125,15 +347,7 @@ class TC2290:
     def instance(self, instance_name='', instance_id=1):
         instance = instance_name.encode()
         assert (len(instance) < 43)
-        message = Message(
-            header=Header(
-                Command.INSTANCE_START,
-                data_size=len(instance),
-                instance=instance_id,
-            ),
-            data=Data(data=list(instance)),
-        )
-        self.send(message)
+        self.send(instance_start(instance, instance_id))
 
 
 class CallbackManager:
@@ -157,12 +371,16 @@ class CallbackManager:
 
 
 def main():
+    logging.basicConfig(level=logging.DEBUG)
     tc = TC2290(receive_callback=CallbackManager().print)
     print(tc.fw_ver())
     tc.wakeup()
     tc.all()
-    while True:
-        tc.poll()
+    tc.start()
+    try:
+        tc.join()
+    except KeyboardInterrupt:
+        tc.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,146 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT asyncio transport
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable
+
+from tc2290 import TC2290
+from tc2290.protocol import Address, Command, Data, Event, Frame, RegisterEvent
+
+
+class AsyncTC2290:
+    """
+    Awaitable TC2290
+
+    Reads happen in the TC2290 threaded I/O mode and are handed over to the event loop.
+    Writes happen in order on a writer thread so that the event loop never blocks on the device.
+    Register replies are matched to their query by command and address.
+    Everything else is available from events().
+
+    Usage:
+        async with AsyncTC2290() as dev:
+            print(await dev.fw_ver())
+            async for event in dev.events():
+                ...
+    """
+    device: TC2290
+    dropped: int  # Events dropped because the queue was full
+
+    _loop: asyncio.AbstractEventLoop | None
+    _writer: ThreadPoolExecutor
+    _closed: bool
+    _event_callback: Callable[[Event], None] | None
+    _events: asyncio.Queue
+    _pending: dict[tuple[int, int], deque[asyncio.Future]]
+
+    def __init__(self, queue_size: int = 1024, **kwargs) -> None:
+        """
+        :param queue_size: Maximum number of events waiting to be consumed. Older events are dropped when full.
+        :param kwargs: Passed over to TC2290. An event_callback is called from the consumer thread before the event
+                       is handed over to the event loop.
+        """
+        self._loop = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='TC2290 writer')  # Keeps the order
+        self._closed = False
+        self._events = asyncio.Queue(queue_size)
+        self._pending = {}
+        self.dropped = 0
+        self._event_callback = kwargs.pop('event_callback', None)
+        self.device = TC2290(event_callback=self._post, **kwargs)
+
+    async def __aenter__(self) -> 'AsyncTC2290':
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    async def start(self) -> None:
+        if self._closed:
+            raise RuntimeError("stopped")
+        self._loop = asyncio.get_running_loop()
+        self.device.start()
+
+    async def stop(self) -> None:
+        """
+        Stops the I/O once the pending writes are done and releases the device
+        """
+        if self._closed:
+            return
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._writer, self.device.close)  # After the pending writes
+        finally:
+            self._writer.shutdown(wait=False)  # Idle by now
+        for pending in self._pending.values():
+            for future in pending:
+                future.cancel()
+        self._pending.clear()
+
+    def _post(self, event: Event) -> None:
+        # Called from the consumer thread
+        if self._event_callback:
+            self._event_callback(event)
+        self._loop.call_soon_threadsafe(self._on_event, event)
+
+    def _on_event(self, event: Event) -> None:
+        if isinstance(event, RegisterEvent):
+            pending = self._pending.get((event.command, event.address))
+            while pending:
+                future = pending.popleft()
+                if not future.done():
+                    future.set_result(event)
+                    return
+        if self._events.full():
+            self._events.get_nowait()
+            self.dropped += 1
+        self._events.put_nowait(event)
+
+    async def events(self) -> AsyncIterator[Event]:
+        """
+        Unsolicited events (Buttons, focus pings, unmatched replies…)
+        """
+        while True:
+            yield await self._events.get()
+
+    async def send(self, frame: Frame) -> None:
+        await self._loop.run_in_executor(self._writer, self.device.send, frame)
+
+    async def query(self, frame: Frame, timeout: float | None = 1.0) -> Event:
+        """
+        Sends a message and waits for the reply with the same command and address
+
+        Several queries may be outstanding. Replies to the same command and address are matched in order.
+        """
+        command, address = frame[0], frame[3]
+        future = self._loop.create_future()
+        pending = self._pending.setdefault((command, address), deque())
+        pending.append(future)
+        try:
+            await self.send(frame)
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, OSError, ValueError):
+            try:
+                pending.remove(future)
+            except ValueError:
+                pass
+            raise
+
+    async def read_reg(self, address: Address | int, size: int = Data.MAX_SIZE, timeout: float | None = 1.0) -> bytes:
+        """
+        Register payload
+        """
+        event = await self.query(Frame(Command.READ_REG, address=address, data=bytes(size)), timeout)
+        return event.payload
+
+    async def fw_ver(self, timeout: float | None = 1.0) -> str:
+        version = await self.read_reg(Address.VERSION, timeout=timeout)
+        return version.rstrip(b'\x00').decode('ASCII')
@@ -0,0 +1,218 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Button input engine
+"""
+import threading
+import time
+from enum import Enum, auto
+from typing import Callable
+
+from tc2290.protocol import Address, ButtonEvent, Event
+from tc2290.surface import Surface
+
+# Buttons repeating while held
+REPEATING = frozenset((
+    Address.MODULATION__SPEED_UP,
+    Address.MODULATION__SPEED_DOWN,
+    Address.MODULATION__DEPTH_UP,
+    Address.MODULATION__DEPTH_DOWN,
+    Address.DELAY__UP,
+    Address.DELAY__DOWN,
+    Address.FEEDBACK__UP,
+    Address.FEEDBACK__DOWN,
+    Address.PRESET_SPEC__PRESET_UP,
+    Address.PRESET_SPEC__PRESET_DOWN,
+))
+
+
+class InputKind(Enum):
+    PRESS = auto()
+    RELEASE = auto()
+    REPEAT = auto()
+
+
+class InputEvent:
+    __slots__ = ('button', 'kind', 'time', 'duration')
+
+    button: Address
+    kind: InputKind
+    time: float  # Monotonic
+    duration: float  # Seconds the button has been held. 0 on press.
+
+    def __init__(self, button: Address, kind: InputKind, time: float, duration: float = 0.0) -> None:
+        self.button = button
+        self.kind = kind
+        self.time = time
+        self.duration = duration
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.button.name}, {self.kind.name}, duration={self.duration:.3f})'
+
+
+class InputEngine:
+    """
+    Turns button reports into press, release and repeat events
+
+    The device sends the same report on press and on release so the state is inferred by toggling.
+    A press coming less than debounce seconds after the release of the same button is ignored along with its release.
+    Handlers are looked up in a table indexed by button address.
+
+    Repeats are generated by tick(). Either call it from the application loop or start() a background thread.
+
+    Usage:
+        engine = InputEngine()
+        engine.on(Address.DELAY__UP, lambda event: ...)
+        tc = TC2290(event_callback=engine.feed)
+        engine.start()
+        tc.start()
+    """
+    delay: float
+    period: float
+    debounce: float
+
+    _surface: Surface | None
+    _handlers: list[list[Callable[[InputEvent], None]]]
+    _pressed_at: list[float | None]  # By address. None when released.
+    _released_at: list[float]  # By address
+    _next_repeat: dict[int, float]  # By held repeating button
+    _bounced: bytearray  # By address. Release to ignore.
+    _repeating: frozenset[int]
+    _lock: threading.Lock
+    _wakeup: threading.Event
+    _running: bool
+    _thread: threading.Thread | None
+
+    def __init__(
+            self,
+            surface: Surface | None = None,
+            delay: float = 0.5,
+            rate: float = 10.0,
+            debounce: float = 0.0,
+            repeating: frozenset[int] = REPEATING,
+    ) -> None:
+        """
+        :param surface: Button states are kept up-to-date there
+        :param delay: Seconds held before repeating
+        :param rate: Repeats per second
+        :param debounce: Seconds
+        :param repeating: Buttons repeating while held
+        """
+        self.delay = delay
+        self.period = 1 / rate
+        self.debounce = debounce
+        self._surface = surface
+        self._handlers = [[] for _ in range(256)]
+        self._pressed_at = [None] * 256
+        self._released_at = [float('-inf')] * 256
+        self._next_repeat = {}
+        self._bounced = bytearray(256)
+        self._repeating = repeating
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def on(self, button: Address, handler: Callable[[InputEvent], None]) -> None:
+        self._handlers[button].append(handler)
+
+    def off(self, button: Address, handler: Callable[[InputEvent], None]) -> None:
+        self._handlers[button].remove(handler)
+
+    def pressed(self, button: Address) -> bool:
+        return self._pressed_at[button] is not None
+
+    def feed(self, event: Event) -> None:
+        """
+        Event callback. Everything but button events is ignored.
+        """
+        if not isinstance(event, ButtonEvent):
+            return
+        if event.pressed:
+            self.press(event.button)
+        else:
+            self.release(event.button)
+
+    def press(self, button: Address, now: float | None = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            if now - self._released_at[button] < self.debounce:
+                self._bounced[button] = 1
+                return
+            self._pressed_at[button] = now
+            if button in self._repeating:
+                self._next_repeat[button] = now + self.delay
+        self._set_state(button, True)
+        self._dispatch(InputEvent(button, InputKind.PRESS, now))
+        if button in self._repeating:
+            self._wakeup.set()
+
+    def release(self, button: Address, now: float | None = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            if self._bounced[button]:
+                self._bounced[button] = 0
+                return
+            pressed_at = self._pressed_at[button]
+            self._pressed_at[button] = None
+            self._released_at[button] = now
+            self._next_repeat.pop(button, None)
+        self._set_state(button, False)
+        duration = now - pressed_at if pressed_at is not None else 0.0
+        self._dispatch(InputEvent(button, InputKind.RELEASE, now, duration))
+
+    def tick(self, now: float | None = None) -> float | None:
+        """
+        Generates the repeats due
+
+        :return: When the next repeat is due, if any
+        """
+        if now is None:
+            now = time.monotonic()
+        due = []
+        with self._lock:
+            for button, deadline in self._next_repeat.items():
+                if deadline <= now:
+                    due.append((button, now - self._pressed_at[button]))
+                    deadline += self.period
+                    if deadline <= now:  # Skip the repeats missed rather than bursting them
+                        deadline = now + self.period
+                    self._next_repeat[button] = deadline
+            next_repeat = min(self._next_repeat.values(), default=None)
+        for button, duration in due:
+            self._dispatch(InputEvent(button, InputKind.REPEAT, now, duration))
+        return next_repeat
+
+    def _set_state(self, button: Address, state: bool) -> None:
+        if self._surface is not None:
+            self._surface.address_map[button].state = state
+
+    def _dispatch(self, event: InputEvent) -> None:
+        for handler in self._handlers[event.button]:
+            handler(event)
+
+    def start(self) -> None:
+        if self._running:
+            raise RuntimeError("already started")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='TC2290 input repeat', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while self._running:
+            next_repeat = self.tick()
+            timeout = None if next_repeat is None else max(next_repeat - time.monotonic(), 0.0)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
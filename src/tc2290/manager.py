@@ -0,0 +1,208 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Multiple devices manager
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator
+
+import hid
+
+from tc2290 import TC2290, Transport
+from tc2290.protocol import Event
+
+VENDOR_ID = 0x1220  # tc-electronic
+PRODUCTS = {
+    0x0071: 'TC 2290',
+    0x0073: 'TC 8210',
+}
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    path: bytes
+    product_id: int
+    serial_number: str = ''
+    product_string: str = ''
+
+    @property
+    def product(self) -> str:
+        return PRODUCTS.get(self.product_id, f"0x{self.product_id:04X}")
+
+
+@dataclass
+class Device:
+    info: DeviceInfo
+    name: str  # Instance name
+    tc: TC2290 = field(repr=False)
+
+    @property
+    def surface(self):
+        return self.tc.surface
+
+
+def enumerate_devices(products: Iterable[int] | None = None) -> list[DeviceInfo]:
+    """
+    Supported devices plugged in, by HID path
+    """
+    products = set(PRODUCTS if products is None else products)
+    return [
+        DeviceInfo(
+            path=info['path'],
+            product_id=info['product_id'],
+            serial_number=info.get('serial_number') or '',
+            product_string=info.get('product_string') or '',
+        )
+        for info in hid.enumerate(VENDOR_ID, 0)
+        if info['product_id'] in products
+    ]
+
+
+def open_path(path: bytes) -> Transport:
+    device = hid.device()
+    device.open_path(path)
+    return device
+
+
+class DeviceManager:
+    """
+    Opens every supported device and runs them side by side
+
+    Each device gets its own TC2290 with its own surface, instance name and threaded I/O.
+    A device reading or consuming slowly never holds back the others.
+    Callbacks receive the device the event comes from and are called from that device's consumer thread.
+
+    Usage:
+        with DeviceManager(event_callback=on_event) as manager:
+            manager.open_all()
+            manager.start()
+            ...
+    """
+    devices: dict[bytes, Device]  # By HID path
+
+    _event_callback: Callable[[Device, Event], None] | None
+    _receive_callback: Callable[[Device, list], None] | None
+    _opener: Callable[[bytes], Transport]
+    _queue_size: int
+    _timeout_ms: int
+    _running: bool
+
+    def __init__(
+            self,
+            event_callback: Callable[[Device, Event], None] | None = None,
+            receive_callback: Callable[[Device, list], None] | None = None,
+            opener: Callable[[bytes], Transport] = open_path,
+    ) -> None:
+        """
+        :param opener: Opens a device from its HID path
+        """
+        self.devices = {}
+        self._event_callback = event_callback
+        self._receive_callback = receive_callback
+        self._opener = opener
+        self._queue_size = 1024
+        self._timeout_ms = 100
+        self._running = False
+
+    def __enter__(self) -> 'DeviceManager':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def __iter__(self) -> Iterator[Device]:
+        return iter(list(self.devices.values()))
+
+    def _instance_name(self, info: DeviceInfo) -> str:
+        return f"{info.product} {info.serial_number or len(self.devices) + 1}"
+
+    def open(self, info: DeviceInfo, name: str | None = None) -> Device:
+        """
+        Opens a device by path and registers its instance
+
+        :param name: Instance name. Defaults to the product and serial number.
+        """
+        if info.path in self.devices:
+            return self.devices[info.path]
+        device = Device(info=info, name=name or self._instance_name(info), tc=None)
+        device.tc = TC2290(
+            receive_callback=self._bind(self._receive_callback, device),
+            event_callback=self._bind(self._event_callback, device),
+            transport=self._opener(info.path),
+        )
+        try:
+            device.tc.instance(device.name)
+        except BaseException:
+            try:
+                device.tc.close()
+            except (OSError, ValueError):
+                pass  # Already failing
+            raise
+        self.devices[info.path] = device
+        if self._running:
+            device.tc.start(self._queue_size, self._timeout_ms)
+        logging.info("Opened %s at %r", device.name, info.path)
+        return device
+
+    def open_all(self) -> list[Device]:
+        """
+        Opens every supported device not already opened
+
+        Devices failing to open are logged and skipped.
+        """
+        opened = []
+        for info in enumerate_devices():
+            if info.path in self.devices:
+                continue
+            try:
+                opened.append(self.open(info))
+            except (OSError, ValueError):
+                logging.exception("Opening %s at %r failed", info.product, info.path)
+        return opened
+
+    def close_device(self, path: bytes) -> None:
+        """
+        Closes a device. Devices already gone are just forgotten.
+        """
+        device = self.devices.pop(path, None)
+        if device is None:
+            return
+        try:
+            device.tc.close()
+        except (OSError, ValueError):
+            logging.warning("Closing %s at %r failed", device.name, path, exc_info=True)
+
+    @staticmethod
+    def _bind(callback: Callable | None, device: Device) -> Callable | None:
+        if callback is None:
+            return None
+        return lambda data: callback(device, data)
+
+    def start(self, queue_size: int = 1024, timeout_ms: int = 100) -> None:
+        """
+        Threaded I/O mode for every device, including the ones opened afterwards
+
+        See TC2290.start()
+        """
+        self._queue_size = queue_size
+        self._timeout_ms = timeout_ms
+        self._running = True
+        for device in self:
+            device.tc.start(queue_size, timeout_ms)
+
+    def stop(self) -> None:
+        self._running = False
+        for device in self:
+            device.tc.stop()
+
+    def close(self) -> None:
+        self._running = False
+        for path in list(self.devices):
+            self.close_device(path)
@@ -0,0 +1,241 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Level meters
+
+Drives the bargraphs from audio levels in dBFS.
+"""
+import math
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Callable, Sequence
+
+import numpy as np
+import numpy.typing
+
+from tc2290.protocol import Address
+from tc2290.surface import BarGraph, Meters
+
+# Level lighting each led, in dBFS. Matches the front panel legend.
+THRESHOLDS = (-60.0, -50.0, -40.0, -30.0, -24.0, -18.0, -12.0, -9.0, -6.0, -3.0, 0.0)
+# Levels are clamped to this floor so that silence doesn't break the ballistics
+FLOOR = -120.0
+
+# Bitmaps by number of lit leds
+_BARS = tuple((1 << count) - 1 for count in range(BarGraph.SIZE + 1))
+# Peak led bitmap by number of leds below the peak level
+_PEAKS = (0,) + tuple(1 << index for index in range(BarGraph.SIZE))
+
+_FLOOR_AMPLITUDE = 10.0 ** (FLOOR / 20.0)
+_THRESHOLDS_ARRAY = np.array(THRESHOLDS)
+_BARS_ARRAY = np.array(_BARS, dtype=np.uint16)
+
+
+def block_levels(buffer, channels: int = 2, dtype: np.typing.DTypeLike = np.int16, rms: bool = False) -> np.ndarray:
+    """
+    Level of each channel of a block of interleaved PCM samples
+
+    The samples are read in place from the buffer.
+
+    :param buffer: bytes, bytearray, memoryview, array… holding whole frames
+    :param channels: Samples per frame
+    :param dtype: Sample format. Integers are full scale at their maximum, floats at 1.0.
+    :param rms: RMS instead of peak
+    :return: One level per channel in dBFS. Silence for an empty block.
+    """
+    dtype = np.dtype(dtype)
+    frames = np.frombuffer(buffer, dtype=dtype).reshape(-1, channels)
+    if not len(frames):
+        return np.full(channels, FLOOR)
+    full_scale = float(np.iinfo(dtype).max) + 1 if dtype.kind == 'i' else 1.0
+    if rms:
+        amplitude = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=0))
+    else:
+        # No abs() as it overflows on the minimum integer
+        amplitude = np.maximum(frames.max(axis=0).astype(np.float64), -frames.min(axis=0).astype(np.float64))
+    return 20.0 * np.log10(np.maximum(amplitude / full_scale, _FLOOR_AMPLITUDE))
+
+
+def bitmap(level: float) -> int:
+    """
+    Bargraph register value for a level in dBFS
+    """
+    return _BARS[bisect_right(THRESHOLDS, level)]
+
+
+def bitmaps(levels: np.ndarray) -> np.ndarray:
+    """
+    Bargraph register values for an array of levels in dBFS
+    """
+    return _BARS_ARRAY[np.searchsorted(_THRESHOLDS_ARRAY, levels, side='right')]
+
+
+@dataclass(frozen=True)
+class Ballistics:
+    attack: float = 0.0  # Time constant in seconds. 0 follows rising levels instantly.
+    release: float = 20.0  # Fall rate in dB per second
+    hold: float = 1.5  # Peak hold in seconds. 0 disables the peak led.
+
+
+class Meter:
+    """
+    Ballistics and peak hold state of a single bargraph
+    """
+    __slots__ = ('bar', 'ballistics', 'level', 'peak', '_peak_age')
+
+    bar: BarGraph
+    ballistics: Ballistics
+    level: float  # Displayed level in dBFS
+    peak: float  # Held peak in dBFS
+    _peak_age: float
+
+    def __init__(self, bar: BarGraph, ballistics: Ballistics = Ballistics()) -> None:
+        self.bar = bar
+        self.ballistics = ballistics
+        self.reset()
+
+    def reset(self) -> None:
+        self.level = FLOOR
+        self.peak = FLOOR
+        self._peak_age = 0.0
+
+    def update(self, level: float, dt: float) -> bool:
+        """
+        :param level: Latest level in dBFS
+        :param dt: Seconds elapsed since the previous update. 0 when unknown: rising levels are followed instantly.
+        :return: Whether the bargraph changed
+        """
+        ballistics = self.ballistics
+        level = max(level, FLOOR)
+
+        if level > self.level:
+            if ballistics.attack > 0 and dt > 0:
+                self.level += (level - self.level) * (1.0 - math.exp(-dt / ballistics.attack))
+            else:
+                self.level = level
+        else:
+            self.level = max(level, self.level - ballistics.release * dt)
+
+        value = _BARS[bisect_right(THRESHOLDS, self.level)]
+        if ballistics.hold > 0:
+            if level >= self.peak:
+                self.peak = level
+                self._peak_age = 0.0
+            else:
+                self._peak_age += dt
+                if self._peak_age > ballistics.hold:
+                    self.peak = max(self.level, self.peak - ballistics.release * dt)
+            value |= _PEAKS[bisect_right(THRESHOLDS, self.peak)]
+
+        if value == self.bar.value:
+            return False
+        self.bar.value = value
+        return True
+
+
+class MeterEngine:
+    """
+    Drives the four meters of a surface from audio levels
+
+    Bargraphs are only written when their bitmap changes.
+    Pass WriteScheduler.write as the write callback to send them as they change,
+    or leave it out and rely on Surface.flush().
+    """
+    meters: tuple[Meter, Meter, Meter, Meter]  # Input L, input R, output L, output R
+
+    _write: Callable[[Address, int], None] | None
+    _last: float | None
+
+    def __init__(
+            self,
+            meters: Meters,
+            write: Callable[[Address, int], None] | None = None,
+            ballistics: Ballistics = Ballistics(),
+    ) -> None:
+        """
+        :param meters: Surface meters
+        :param write: Called with the address and value of each bargraph that changed
+        :param ballistics: Applied to every meter
+        """
+        self.meters = (
+            Meter(meters.input.left, ballistics),
+            Meter(meters.input.right, ballistics),
+            Meter(meters.output.left, ballistics),
+            Meter(meters.output.right, ballistics),
+        )
+        self._write = write
+        self._last = None
+
+    def reset(self) -> None:
+        for meter in self.meters:
+            meter.reset()
+        self._last = None
+
+    def update(
+            self,
+            levels: Sequence[float | np.ndarray | None] | np.ndarray,
+            dt: float | None = None,
+    ) -> list[Address]:
+        """
+        :param levels: Input L, input R, output L, output R in dBFS.
+            Either scalars or blocks of levels reduced to their maximum. Empty blocks are silence.
+            None leaves a meter alone. A (4, N) array is accepted too.
+        :param dt: Seconds elapsed since the previous update. Measured when omitted.
+        :return: Addresses of the bargraphs that changed
+        """
+        now = time.monotonic()
+        if dt is None:
+            dt = now - self._last if self._last is not None else 0.0
+        self._last = now
+
+        if isinstance(levels, np.ndarray) and levels.ndim == 2:
+            levels = levels.max(axis=1) if levels.shape[1] else np.full(len(levels), FLOOR)
+
+        changed = []
+        for meter, level in zip(self.meters, levels):
+            if level is None:
+                continue
+            if not isinstance(level, (int, float)):
+                level = float(np.max(level)) if np.size(level) else FLOOR
+            if meter.update(level, dt):
+                address = meter.bar.address
+                changed.append(address)
+                if self._write is not None:
+                    self._write(address, meter.bar.value)
+        return changed
+
+    def update_pcm(
+            self,
+            input_block=None,
+            output_block=None,
+            channels: int = 2,
+            dtype: np.typing.DTypeLike = np.int16,
+            rms: bool = False,
+            dt: float | None = None,
+    ) -> list[Address]:
+        """
+        Meters blocks of interleaved PCM samples
+
+        Mono blocks drive both sides. Channels after the second are ignored.
+
+        :param input_block: Samples for the input meters. None leaves them alone.
+        :param output_block: Samples for the output meters. None leaves them alone.
+        :param channels: Samples per frame
+        :param dtype: Sample format
+        :param rms: RMS instead of peak
+        :param dt: Seconds elapsed since the previous update. Measured when omitted.
+        :return: Addresses of the bargraphs that changed
+        """
+        right = min(channels, 2) - 1
+        levels = [None] * 4
+        if input_block is not None:
+            block = block_levels(input_block, channels, dtype, rms)
+            levels[0], levels[1] = float(block[0]), float(block[right])
+        if output_block is not None:
+            block = block_levels(output_block, channels, dtype, rms)
+            levels[2], levels[3] = float(block[0]), float(block[right])
+        return self.update(levels, dt)
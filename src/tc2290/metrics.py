@@ -0,0 +1,317 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT I/O metrics
+
+Counters and latency histograms updated from the I/O paths.
+Read them with Metrics.collect() or expose them to Prometheus with PrometheusExporter.
+
+Counters are exact. Durations are sampled: only one in Metrics.sample operations is timed.
+Updates take no lock and are never lost, whatever the thread: counters are atomic and histograms record in a shard
+per thread, summed when reading.
+Disabled by default in TC2290. The overhead when enabled is measured by benchmarks/bench_protocol.py.
+"""
+import itertools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+
+class _Sharded:
+    """
+    Per-thread lists of integers, summed on read
+    """
+    __slots__ = ('_size', '_local', '_shards', '_lock')
+
+    _size: int
+    _local: threading.local
+    _shards: list[list[int]]
+    _lock: threading.Lock
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()  # Only taken when a thread records for the first time, and on read
+
+    def _shard(self) -> list[int]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = [0] * self._size
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _sum(self) -> list[int]:
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(values) for values in zip(*shards)] if shards else [0] * self._size
+
+
+class Counter(itertools.count):
+    """
+    Thread-safe counter
+
+    Incremented with next(counter), which returns the new value.
+    That's a single C call that the GIL keeps atomic and the cheapest update there is.
+    """
+    __slots__ = ('_reads', '_lock')
+
+    _reads: int
+    _lock: threading.Lock
+
+    def __new__(cls) -> 'Counter':
+        self = super().__new__(cls, 1)
+        self._reads = 0
+        self._lock = threading.Lock()
+        return self
+
+    @property
+    def value(self) -> int:
+        # itertools.count can't be peeked at: reading takes a number too
+        with self._lock:
+            self._reads += 1
+            return next(self) - self._reads
+
+
+class Histogram(_Sharded):
+    """
+    Durations in nanoseconds
+
+    Bucket i counts the durations below 2^i ns. Recording is a bit_length() and three additions.
+    """
+    BUCKETS = 32  # Up to ~2 s. Longer durations go to the last bucket.
+    _COUNT = BUCKETS
+    _SUM = BUCKETS + 1
+
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        super().__init__(self.BUCKETS + 2)  # Buckets, count and sum
+
+    def observe(self, duration_ns: int) -> None:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        index = duration_ns.bit_length()
+        shard[index if index < self.BUCKETS else self.BUCKETS - 1] += 1
+        shard[self._COUNT] += 1
+        shard[self._SUM] += duration_ns
+
+    def snapshot(self) -> tuple[list[int], int, int]:
+        """
+        Buckets, count and sum (ns) over every thread
+        """
+        values = self._sum()
+        return values[:self.BUCKETS], values[self._COUNT], values[self._SUM]
+
+    @property
+    def buckets(self) -> list[int]:
+        return self.snapshot()[0]
+
+    @property
+    def count(self) -> int:
+        return self.snapshot()[1]
+
+    @property
+    def sum(self) -> int:
+        return self.snapshot()[2]
+
+    @property
+    def mean(self) -> float:
+        """
+        Seconds
+        """
+        _, count, total = self.snapshot()
+        return total / count / 1e9 if count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q quantile, in seconds
+        """
+        buckets, count, _ = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket in enumerate(buckets):
+            seen += bucket
+            if seen >= rank:
+                return 2 ** index / 1e9
+        return 2 ** (self.BUCKETS - 1) / 1e9
+
+
+class Metrics:
+    """
+    TC2290 I/O metrics
+
+    Gauges are read when collecting.
+    Disabled metrics are left alone by TC2290, which disables them by default.
+    """
+    COUNTERS = ('reports_read', 'reports_written', 'reports_decoded', 'polls', 'empty_polls')
+    HISTOGRAMS = ('hid_read', 'hid_write', 'encode', 'decode')
+
+    enabled: bool
+    sample: int  # One in sample operations is timed
+
+    polls: Counter  # Non-blocking reads
+    data_polls: Counter  # Non-blocking reads returning a report
+    reports_read: Counter
+    reports_written: Counter  # Handed over to hidapi
+    reports_decoded: Counter
+
+    hid_read: Histogram  # hidapi read call, non-blocking reads only
+    hid_write: Histogram  # hidapi write call
+    encode: Histogram  # Message to report conversion
+    decode: Histogram  # Report to event conversion
+
+    _gauges: dict[str, Callable[[], float]]
+    _start: float
+    _previous: tuple[float, dict[str, int]]  # Last collection time and counters
+
+    def __init__(self, enabled: bool = True, sample: int = 64) -> None:
+        """
+        :param enabled: Disabled metrics cost a single check per operation
+        :param sample: Time one in sample operations. 1 times them all.
+        """
+        self.enabled = enabled
+        self.sample = sample
+        for name in ('polls', 'data_polls', 'reports_read', 'reports_written', 'reports_decoded'):
+            setattr(self, name, Counter())
+        for name in self.HISTOGRAMS:
+            setattr(self, name, Histogram())
+        self._gauges = {}
+        self._start = time.monotonic()
+        self._previous = (self._start, {name: 0 for name in self.COUNTERS})
+
+    def counters(self) -> dict[str, int]:
+        polls = self.polls.value
+        return {
+            'reports_read': self.reports_read.value,
+            'reports_written': self.reports_written.value,
+            'reports_decoded': self.reports_decoded.value,
+            'polls': polls,
+            'empty_polls': polls - self.data_polls.value,
+        }
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """
+        Registers a value read when collecting
+
+        E.g. metrics.gauge('write_queue_depth', lambda: scheduler.pending)
+        """
+        self._gauges[name] = read
+
+    def collect(self) -> dict[str, float]:
+        """
+        Current values
+
+        Rates are computed over the time elapsed since the previous collection.
+        """
+        now = time.monotonic()
+        counters = self.counters()
+        previous_time, previous = self._previous
+        elapsed = now - previous_time
+        self._previous = (now, counters)
+
+        values: dict[str, float] = {'uptime_seconds': now - self._start}
+        values.update(counters)
+        if elapsed > 0:
+            values['reports_read_per_second'] = (counters['reports_read'] - previous['reports_read']) / elapsed
+            values['reports_written_per_second'] = (
+                    (counters['reports_written'] - previous['reports_written']) / elapsed
+            )
+        values['empty_poll_ratio'] = counters['empty_polls'] / counters['polls'] if counters['polls'] else 0.0
+        for name in self.HISTOGRAMS:
+            histogram = getattr(self, name)
+            values[f'{name}_seconds_mean'] = histogram.mean
+            values[f'{name}_seconds_p99'] = histogram.quantile(0.99)
+        for name, read in self._gauges.items():
+            values[name] = float(read())
+        return values
+
+    def prometheus(self, prefix: str = 'tc2290_') -> str:
+        """
+        Prometheus text exposition format
+        """
+        lines = []
+        for name, value in self.counters().items():
+            lines.append(f'# TYPE {prefix}{name}_total counter')
+            lines.append(f'{prefix}{name}_total {value}')
+        for name in self.HISTOGRAMS:
+            buckets, total_count, total = getattr(self, name).snapshot()
+            metric = f'{prefix}{name}_seconds'
+            lines.append(f'# TYPE {metric} histogram')
+            cumulative = 0
+            for index, count in enumerate(buckets[:-1]):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{2 ** index / 1e9:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {total_count}')
+            lines.append(f'{metric}_sum {total / 1e9:g}')
+            lines.append(f'{metric}_count {total_count}')
+        for name, read in self._gauges.items():
+            lines.append(f'# TYPE {prefix}{name} gauge')
+            lines.append(f'{prefix}{name} {float(read()):g}')
+        return '\n'.join(lines) + '\n'
+
+
+class PrometheusExporter:
+    """
+    Serves metrics over HTTP for Prometheus to scrape
+
+    Usage:
+        tc = TC2290(metrics=Metrics())
+        exporter = PrometheusExporter(tc.metrics)
+        exporter.start()
+        # curl http://127.0.0.1:9290/metrics
+    """
+    metrics: Metrics
+    address: tuple[str, int]
+
+    _server: ThreadingHTTPServer | None
+    _thread: threading.Thread | None
+
+    def __init__(self, metrics: Metrics, host: str = '127.0.0.1', port: int = 9290) -> None:
+        """
+        :param host: Local only by default
+        :param port: 0 picks a free port. See address once started.
+        """
+        self.metrics = metrics
+        self.address = (host, port)
+        self._server = None
+        self._thread = None
+
+    def start(self) -> None:
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass  # Scrapes are not worth logging
+
+        self._server = ThreadingHTTPServer(self.address, Handler)
+        self.address = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='TC2290 metrics', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -6,9 +6,10 @@
 """
 TC2290-DT Reverse engineered protocol
 """
+import struct
 from dataclasses import dataclass, field
 from enum import unique, IntEnum
-from typing import Sequence
+from typing import Iterable, Iterator, Mapping, Sequence
 
 
 @unique
@@ -155,6 +156,9 @@ class Chunk(Sequence):
             raise IndexError("index out of range")
         return self.data[item]
 
+    def __bytes__(self) -> bytes:
+        return bytes(self.data[:self.SIZE])
+
 
 class DataDescriptor:
     def __init__(self, *, default_factory):
@@ -220,6 +224,9 @@ class Data(Sequence):
             raise IndexError("index out of range")
         return self.data[item]
 
+    def __bytes__(self) -> bytes:
+        return b''.join(map(bytes, self.data))
+
 
 class DataSizeDescriptor:
     def __init__(self, *, default):
@@ -296,6 +303,7 @@ class Header(Sequence):
     Format: <command> <data size> 00 <address> <instance> 00 00 00
     """
     SIZE = 8
+    STRUCT = struct.Struct('<BBxBI')  # Instance is a little-endian 32 bits word
 
     command: Command | int = CommandDescriptor(default=None)
     data_size: int = DataSizeDescriptor(default=None)
@@ -319,6 +327,9 @@ class Header(Sequence):
         else:
             return 0x00
 
+    def __bytes__(self) -> bytes:
+        return self.STRUCT.pack(self.command, self.data_size, self.address, self.instance)
+
     def __str__(self) -> str:
         value = ''
         for i in range(self.SIZE):
@@ -390,9 +401,342 @@ class Message(Sequence):
             chunk_index = data_index % 4
             return self.data[chunk][chunk_index]
 
+    def __bytes__(self) -> bytes:
+        return bytes(self.header) + bytes(self.data)
+
+
+class Frame:
+    """
+    Bytes-backed message
+
+    Header and data are packed straight into a preallocated buffer, bypassing Header, Data and Chunk.
+    Serializes byte for byte like the equivalent Message.
+
+    The buffer starts with the HID report ID so that it can be handed over to the device as is.
+    """
+    REPORT_ID = 0x00
+    REPORT_SIZE = 1 + Message.MAX_SIZE
+
+    _DATA_OFFSET = 1 + Header.SIZE
+    _DEFAULT_DATA = bytes(Data.MAX_SIZE)  # Zero padded, like Message
+    _WORDS = tuple(struct.Struct(f'<{count}I') for count in range(Data.MAX_CHUNKS + 1))
+
+    __slots__ = ('_buffer', 'size')
+
+    _buffer: bytearray
+    size: int
+
+    def __init__(
+            self,
+            command: Command | int,
+            address: Address | int = 0x00,
+            data: bytes | Sequence[int] | None = None,
+            instance: int = 0x01,
+    ) -> None:
+        if data is None:
+            data = self._DEFAULT_DATA
+        length = len(data)
+        if length > Data.MAX_SIZE:
+            raise ValueError(f"data size should not exceed {Data.MAX_SIZE}")
+        self._buffer = bytearray(self.REPORT_SIZE)
+        self._buffer[self._DATA_OFFSET:self._DATA_OFFSET + length] = data
+        self._pack_header(command, address, length + -length % Chunk.SIZE, instance)
+
+    @classmethod
+    def from_words(
+            cls,
+            command: Command | int,
+            address: Address | int,
+            words: Sequence[int],
+            instance: int = 0x01,
+    ) -> 'Frame':
+        """
+        Data as 32 bits register values
+        """
+        count = len(words)
+        if count > Data.MAX_CHUNKS:
+            raise ValueError(f"data size should not exceed {Data.MAX_CHUNKS}")
+        frame = cls.__new__(cls)
+        frame._buffer = bytearray(cls.REPORT_SIZE)
+        cls._WORDS[count].pack_into(frame._buffer, cls._DATA_OFFSET, *words)
+        frame._pack_header(command, address, count * Chunk.SIZE, instance)
+        return frame
+
+    @classmethod
+    def from_bytes(cls, data: bytes | Sequence[int]) -> 'Frame':
+        """
+        Raw message, header included
+        """
+        length = len(data)
+        if length > Message.MAX_SIZE:
+            raise ValueError(f"message size should not exceed {Message.MAX_SIZE}")
+        frame = cls.__new__(cls)
+        frame._buffer = bytearray(cls.REPORT_SIZE)
+        frame._buffer[1:1 + length] = data
+        frame.size = length
+        return frame
+
+    def _pack_header(self, command: int, address: int, data_size: int, instance: int) -> None:
+        Header.STRUCT.pack_into(self._buffer, 1, command, data_size, address, instance)
+        self.size = Header.SIZE + data_size
+
+    @property
+    def report(self) -> memoryview:
+        """
+        HID report (Report ID followed by the message) without copy
+        """
+        return memoryview(self._buffer)[:1 + self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, item):
+        return self._buffer[1:1 + self.size][item]
+
+    def __bytes__(self) -> bytes:
+        return bytes(self._buffer[1:1 + self.size])
+
+
+# Registers that work together.
+# A message not sent in sequence will reset all the elements that follow in that block.
+BLOCKS = (
+    range(0x40, Address.PAN_DYN__LED_DELAY + 1),
+    range(Address.PAN_DYN__LED_DIRECT, Address.FEEDBACK__LED_F_BACK + 1),
+    range(Address.FEEDBACK__LED_INV, Address.PRESET_SPEC__LED_DELAY_ON + 1),
+)
+
+# Block index by address. Addresses outside of the known blocks are blocks of their own.
+_BLOCK_BY_ADDRESS = tuple(
+    next((i for i, block in enumerate(BLOCKS) if address in block), len(BLOCKS) + address)
+    for address in range(256)
+)
+
+
+def write_frames(registers: Mapping[int, int], dirty: Iterable[int]) -> list[Frame]:
+    """
+    WRITE_REG messages for the dirty registers
+
+    Contiguous registers are grouped in correctly sized messages that never cross a block boundary.
+    Registers with a known value lying between dirty ones are rewritten when it saves a message.
+
+    :param registers: Values by address. Must contain the dirty registers.
+    :param dirty: Addresses to write
+    """
+    frames = []
+    start = end = None
+    for address in sorted(dirty):
+        if (
+                start is not None
+                and address - start < Data.MAX_CHUNKS
+                and _BLOCK_BY_ADDRESS[address] == _BLOCK_BY_ADDRESS[start]
+                and all(gap in registers for gap in range(end + 1, address))
+        ):
+            end = address
+            continue
+        if start is not None:
+            frames.append(Frame.from_words(Command.WRITE_REG, start, [registers[a] for a in range(start, end + 1)]))
+        start = end = address
+    if start is not None:
+        frames.append(Frame.from_words(Command.WRITE_REG, start, [registers[a] for a in range(start, end + 1)]))
+    return frames
+
+
+# INSTANCE_START layout, as captured: the instance name followed by a state byte. 01 in the request, 02 in the echo.
+INSTANCE_NAME_OFFSET = Header.SIZE
+INSTANCE_NAME_SIZE = 43
+INSTANCE_STATE_OFFSET = 52
+INSTANCE_DATA_SIZE = INSTANCE_STATE_OFFSET + 1 - Header.SIZE  # 0x2D. Not a multiple of the chunk size.
+
+
+def instance_start(name: bytes, instance: int = 0x01) -> Frame:
+    """
+    INSTANCE_START message registering an instance name, byte for byte like the plugin sends it
+
+    :param name: Truncated to 43 bytes
+    """
+    message = bytearray(INSTANCE_STATE_OFFSET + 1)
+    Header.STRUCT.pack_into(message, 0, Command.INSTANCE_START, INSTANCE_DATA_SIZE, 0x00, instance)
+    name = name[:INSTANCE_NAME_SIZE]
+    message[INSTANCE_NAME_OFFSET:INSTANCE_NAME_OFFSET + len(name)] = name
+    message[INSTANCE_STATE_OFFSET] = 0x01
+    return Frame.from_bytes(message)
+
 
 # Sanity checks
 assert (Data.MAX_CHUNKS * Chunk.SIZE == Data.MAX_SIZE)
 assert (Header.SIZE + Data.MAX_SIZE == Message.MAX_SIZE)
+assert (Header.STRUCT.size == Header.SIZE)
+
 
-# TODO: decoder
+# Decoder
+
+class Event:
+    """
+    Report received from the device
+    """
+    __slots__ = ('data', 'command', 'address', 'instance')
+
+    data: bytes
+    command: int
+    address: int
+    instance: int
+
+    def __init__(self, data: bytes, command: int, address: int, instance: int) -> None:
+        self.data = data
+        self.command = command
+        self.address = address
+        self.instance = instance
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(command=0x{self.command:02X}, address=0x{self.address:02X})'
+
+
+class ButtonEvent(Event):
+    """
+    Button press or release
+
+    Format: 0C 08 00 00 FF FF FF FF <button address> 00 00 00 <52 bytes of gibberish>
+    The state is not encoded in the report so the decoder infers it by toggling.
+    """
+    __slots__ = ('button', 'pressed')
+
+    button: Address
+    pressed: bool
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.button.name}, pressed={self.pressed})'
+
+
+class ReplyEvent(Event):
+    """
+    Acknowledgement
+    """
+    __slots__ = ()
+
+
+class RegisterEvent(Event):
+    """
+    READ_REG reply
+
+    Format: the request header followed by the register data
+    """
+    __slots__ = ('payload',)
+
+    payload: bytes
+
+    @property
+    def words(self) -> tuple[int, ...]:
+        """
+        Payload as 32 bits register values
+        """
+        return Frame._WORDS[len(self.payload) // Chunk.SIZE].unpack_from(self.payload)
+
+
+class FocusEvent(Event):
+    """
+    INSTANCE_FOCUS ping
+
+    The address holds the instance slot (00 to 03).
+    """
+    __slots__ = ()
+
+
+class InstanceEvent(Event):
+    """
+    INSTANCE_START echo
+
+    Byte 52 is 01 in the request and 02 in the reply.
+    """
+    NAME_OFFSET = INSTANCE_NAME_OFFSET
+    NAME_SIZE = INSTANCE_NAME_SIZE
+    STATE_OFFSET = INSTANCE_STATE_OFFSET
+
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return self.data[self.NAME_OFFSET:self.NAME_OFFSET + self.NAME_SIZE].rstrip(b'\x00').decode(errors='replace')
+
+    @property
+    def state(self) -> int:
+        return self.data[self.STATE_OFFSET]
+
+
+class UnknownEvent(Event):
+    __slots__ = ()
+
+
+class Decoder:
+    """
+    Streaming decoder for reports coming from the device
+
+    Dispatches on the command byte then, for replies, on the button address byte using precomputed tables.
+    """
+    BUTTON_OFFSET = Header.SIZE
+    BUTTON_DATA_SIZE = 0x08
+    BUTTON_INSTANCE = 0xFFFFFFFF
+
+    # Button address by byte value, None for anything that isn't a button
+    _BUTTONS: tuple[Address | None, ...] = tuple(
+        Address(value) if value >= Address.MODULATION__SPEED_UP and value in Address._value2member_map_ else None
+        for value in range(256)
+    )
+
+    _pressed: bytearray
+    _dispatch: list
+
+    def __init__(self) -> None:
+        self._pressed = bytearray(256)
+        self._dispatch = [self._unknown] * 256
+        self._dispatch[Command.INSTANCE_START] = self._instance
+        self._dispatch[Command.REPLY] = self._reply
+        self._dispatch[Command.INSTANCE_FOCUS] = self._focus
+        self._dispatch[Command.READ_REG] = self._register
+
+    def decode(self, data: bytes | Sequence[int]) -> Event:
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        command, data_size, address, instance = Header.STRUCT.unpack_from(data)
+        return self._dispatch[command](data, command, data_size, address, instance)
+
+    def feed(self, reports: Iterable[bytes | Sequence[int]]) -> Iterator[Event]:
+        decode = self.decode
+        for data in reports:
+            if data:
+                yield decode(data)
+
+    def reset(self) -> None:
+        """
+        Forget about pressed buttons
+        """
+        self._pressed[:] = bytes(256)
+
+    def _reply(self, data: bytes, command: int, data_size: int, address: int, instance: int) -> Event:
+        if data_size != self.BUTTON_DATA_SIZE or instance != self.BUTTON_INSTANCE:
+            return ReplyEvent(data, command, address, instance)
+        button = self._BUTTONS[data[self.BUTTON_OFFSET]]
+        if button is None:
+            return ReplyEvent(data, command, address, instance)
+        event = ButtonEvent(data, command, address, instance)
+        event.button = button
+        self._pressed[button] ^= 1
+        event.pressed = bool(self._pressed[button])
+        return event
+
+    @staticmethod
+    def _register(data: bytes, command: int, data_size: int, address: int, instance: int) -> Event:
+        event = RegisterEvent(data, command, address, instance)
+        event.payload = data[Header.SIZE:Header.SIZE + data_size]
+        return event
+
+    @staticmethod
+    def _focus(data: bytes, command: int, data_size: int, address: int, instance: int) -> Event:
+        return FocusEvent(data, command, address, instance)
+
+    @staticmethod
+    def _instance(data: bytes, command: int, data_size: int, address: int, instance: int) -> Event:
+        return InstanceEvent(data, command, address, instance)
+
+    @staticmethod
+    def _unknown(data: bytes, command: int, data_size: int, address: int, instance: int) -> Event:
+        return UnknownEvent(data, command, address, instance)
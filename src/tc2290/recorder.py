@@ -0,0 +1,179 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Live pcapng recorder
+
+Writes the reports in the same format as the USBPcap captures so that they open in Wireshark and replay with
+src/re_tools/replayer.py.
+
+Usage:
+    with PcapngRecorder('session.pcapng') as recorder:
+        tc = TC2290(trace=recorder)
+        ...
+"""
+import itertools
+import os
+import struct
+import threading
+import time
+
+from tc2290.protocol import Message
+from tc2290.trace import Direction
+
+LINKTYPE_USBPCAP = 249
+
+_SECTION_HEADER = 0x0A0D0D0A
+_INTERFACE_DESCRIPTION = 0x00000001
+_ENHANCED_PACKET = 0x00000006
+_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+_OPTION_END = 0
+_OPTION_SHB_USERAPPL = 4
+_OPTION_IF_TSRESOL = 9
+_TSRESOL_NS = 9
+
+# USBPcap packet header
+# headerLen, irpId, status, function, info, bus, device, endpoint, transfer, dataLength
+_USBPCAP_HEADER = struct.Struct('<HQIHBHHBBI')
+_URB_FUNCTION_BULK_OR_INTERRUPT_TRANSFER = 0x0009
+_USBPCAP_INFO_PDO_TO_FDO = 0x01  # Completion, device to host
+_USBPCAP_TRANSFER_INTERRUPT = 0x01
+
+# As captured
+ENDPOINT_OUT = 0x02
+ENDPOINT_IN = 0x81
+
+_EPB_HEADER = struct.Struct('<IIIIIII')  # Type, length, interface, timestamp high and low, captured, original
+
+
+def _option(code: int, value: bytes) -> bytes:
+    return struct.pack('<HH', code, len(value)) + value + bytes(-len(value) % 4)
+
+
+def _block(block_type: int, body: bytes) -> bytes:
+    length = 12 + len(body)
+    return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+
+class PcapngRecorder:
+    """
+    Records reports to a pcapng file with the USBPcap link type
+
+    Recording only packs the block in memory. A background thread writes them to the file every interval seconds.
+    Pass it to TC2290(trace=...) to record everything sent and received.
+    """
+    path: str
+    interval: float
+
+    _file: object
+    _bus: int
+    _device: int
+    _irp: itertools.count
+    _pending: list[bytes]
+    _lock: threading.Lock
+    _flush_lock: threading.Lock
+    _wakeup: threading.Event
+    _running: bool
+    _thread: threading.Thread
+
+    def __init__(self, path: str | os.PathLike, interval: float = 0.5, bus: int = 1, device: int = 1) -> None:
+        """
+        :param interval: Seconds between writes to the file
+        :param bus: USB bus number shown in Wireshark
+        :param device: USB device address shown in Wireshark
+        """
+        self.path = os.fspath(path)
+        self.interval = interval
+        self._bus = bus
+        self._device = device
+        self._irp = itertools.count(1)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # Keeps the blocks in order
+        self._wakeup = threading.Event()
+        self._file = open(self.path, 'wb')
+        self._file.write(
+            _block(
+                _SECTION_HEADER,
+                struct.pack('<IHHq', _BYTE_ORDER_MAGIC, 1, 0, -1)  # Version 1.0, unknown section length
+                + _option(_OPTION_SHB_USERAPPL, b'tc2290')
+                + _option(_OPTION_END, b''),
+            )
+            + _block(
+                _INTERFACE_DESCRIPTION,
+                struct.pack('<HHI', LINKTYPE_USBPCAP, 0, 0xFFFF)
+                + _option(_OPTION_IF_TSRESOL, bytes((_TSRESOL_NS,)))
+                + _option(_OPTION_END, b''),
+            )
+        )
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='TC2290 pcapng recorder', daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> 'PcapngRecorder':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def record(self, direction: Direction, data) -> None:
+        """
+        :param data: Report without the report ID. Anything bytes() accepts. Ignored once closed.
+        """
+        if not self._running:
+            return
+        timestamp = time.time_ns()
+        data = bytes(data[:Message.MAX_SIZE])
+        if direction is Direction.OUT:
+            data = data.ljust(Message.MAX_SIZE, b'\x00')  # Like on the wire
+            endpoint, info = ENDPOINT_OUT, 0  # Submission carries the data
+        else:
+            endpoint, info = ENDPOINT_IN, _USBPCAP_INFO_PDO_TO_FDO  # Completion carries the data
+        header = _USBPCAP_HEADER.pack(
+            _USBPCAP_HEADER.size, next(self._irp), 0, _URB_FUNCTION_BULK_OR_INTERRUPT_TRANSFER, info,
+            self._bus, self._device, endpoint, _USBPCAP_TRANSFER_INTERRUPT, len(data),
+        )
+        captured = len(header) + len(data)
+        padding = -captured % 4
+        length = _EPB_HEADER.size + captured + padding + 4
+        block = b''.join((
+            _EPB_HEADER.pack(
+                _ENHANCED_PACKET, length, 0, timestamp >> 32, timestamp & 0xFFFFFFFF, captured, captured,
+            ),
+            header,
+            data,
+            bytes(padding),
+            struct.pack('<I', length),
+        ))
+        with self._lock:
+            if self._running:  # Not closed meanwhile
+                self._pending.append(block)
+
+    def flush(self) -> None:
+        """
+        Writes the pending blocks now
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending and not self._file.closed:
+                self._file.write(b''.join(pending))
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+        self._file.close()
+
+    def _run(self) -> None:
+        while self._running:
+            self._wakeup.wait(self.interval)
+            self.flush()
@@ -0,0 +1,173 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Register read-back cache
+"""
+import math
+import struct
+import time
+from typing import Callable, Iterable, Sequence
+
+from tc2290 import TC2290
+from tc2290.protocol import Address, Chunk, Command, Data, Decoder, Event, Frame, RegisterEvent
+
+REGISTERS = 256
+
+# Seconds a register read stays valid, by region. Regions are checked in order.
+DEFAULT_TTLS: tuple[tuple[range, float], ...] = (
+    (range(0x00, Address.GLOBAL__BRIGHTNESS), math.inf),  # Identification and configuration
+    (range(Address.GLOBAL__BRIGHTNESS, REGISTERS), 1.0),  # Surface
+)
+
+
+def requests(addresses: Iterable[int], stop: int = REGISTERS) -> list[tuple[int, int]]:
+    """
+    Fewest READ_REG requests covering the registers
+
+    :return: First register and number of registers of each request
+    """
+    spans = []
+    end = -1
+    for address in sorted(addresses):
+        if address < end:
+            continue
+        end = min(address + Data.MAX_CHUNKS, stop)
+        spans.append((address, end - address))
+    return spans
+
+
+class RegisterCache:
+    """
+    Registers read from the device, kept for a while
+
+    Reads are pipelined: up to window requests are sent before waiting for the replies.
+    Uses TC2290.read() so it can't be used along the threaded I/O mode. See AsyncTC2290.read_reg() for that.
+
+    Usage:
+        registers = RegisterCache(tc)
+        registers.scan()
+        version = registers.read(Address.VERSION, 3).rstrip(b'\\x00').decode('ASCII')
+    """
+    hits: int  # Registers served from the cache
+    misses: int  # Registers read from the device
+
+    _tc: TC2290
+    _data: bytearray
+    _read_at: list[float]  # Monotonic time by register
+    _ttls: list[float]  # By register
+    _window: int
+    _timeout_ms: int
+    _decoder: Decoder
+    _event_callback: Callable[[Event], None] | None
+
+    def __init__(
+            self,
+            tc: TC2290,
+            ttls: Sequence[tuple[range, float]] = DEFAULT_TTLS,
+            window: int = 4,
+            timeout_ms: int = 100,
+            event_callback: Callable[[Event], None] | None = None,
+    ) -> None:
+        """
+        :param ttls: Seconds a read stays valid, by region. Registers outside of any region are never cached.
+        :param window: Maximum number of requests waiting for their reply
+        :param timeout_ms: How long to wait for a reply
+        :param event_callback: Receives whatever else the device sends meanwhile
+        """
+        self.hits = 0
+        self.misses = 0
+        self._tc = tc
+        self._data = bytearray(REGISTERS * Chunk.SIZE)
+        self._read_at = [-math.inf] * REGISTERS
+        self._ttls = [0.0] * REGISTERS
+        for region, ttl in reversed(ttls):  # First region wins
+            for address in region:
+                self._ttls[address] = ttl
+        self._window = window
+        self._timeout_ms = timeout_ms
+        self._decoder = Decoder()
+        self._event_callback = event_callback
+
+    def invalidate(self, addresses: Iterable[int] | None = None) -> None:
+        if addresses is None:
+            addresses = range(REGISTERS)
+        for address in addresses:
+            self._read_at[address] = -math.inf
+
+    def fresh(self, address: int, now: float | None = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+        return now - self._read_at[address] < self._ttls[address]
+
+    def scan(self, start: int = 0, stop: int = REGISTERS, force: bool = False) -> int:
+        """
+        Reads every register of the range that isn't in the cache already
+
+        :param force: Read cached registers too
+        :return: Number of registers read
+        """
+        now = time.monotonic()
+        stale = [address for address in range(start, stop) if force or not self.fresh(address, now)]
+        return self._fetch(requests(stale))
+
+    def read(self, address: Address | int, count: int = 1) -> bytes:
+        """
+        Registers data, from the cache when possible
+
+        :raises TimeoutError: The device didn't reply
+        """
+        now = time.monotonic()
+        addresses = range(address, address + count)
+        stale = [register for register in addresses if not self.fresh(register, now)]
+        self.hits += count - len(stale)
+        if stale:
+            self._fetch(requests(stale, addresses.stop))
+            if any(self._read_at[register] < now for register in stale):
+                raise TimeoutError(f"no reply reading register 0x{address:02X}")
+        return bytes(self._data[address * Chunk.SIZE:(address + count) * Chunk.SIZE])
+
+    def words(self, address: Address | int, count: int = 1) -> tuple[int, ...]:
+        """
+        Registers values, from the cache when possible
+        """
+        return struct.unpack(f'<{count}I', self.read(address, count))
+
+    def _fetch(self, spans: list[tuple[int, int]]) -> int:
+        send = self._tc.send
+        read = self._tc.read
+        decode = self._decoder.decode
+        pending = iter(spans)
+        outstanding = {}  # Register count by first register
+        fetched = 0
+        while True:
+            while len(outstanding) < self._window:
+                span = next(pending, None)
+                if span is None:
+                    break
+                address, count = span
+                send(Frame(Command.READ_REG, address=address, data=bytes(count * Chunk.SIZE)))
+                outstanding[address] = count
+            if not outstanding:
+                break
+            report = read(self._timeout_ms)
+            if not report:
+                outstanding.clear()  # Lost. What's left in the pipeline is still sent.
+                continue
+            event = decode(report)
+            if isinstance(event, RegisterEvent) and event.address in outstanding:
+                count = min(outstanding.pop(event.address), len(event.payload) // Chunk.SIZE)
+                self._store(event.address, event.payload[:count * Chunk.SIZE])
+                fetched += count
+            elif self._event_callback:
+                self._event_callback(event)
+        self.misses += fetched
+        return fetched
+
+    def _store(self, address: int, payload: bytes) -> None:
+        now = time.monotonic()
+        self._data[address * Chunk.SIZE:address * Chunk.SIZE + len(payload)] = payload
+        for register in range(address, address + len(payload) // Chunk.SIZE):
+            self._read_at[register] = now
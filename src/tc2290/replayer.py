@@ -0,0 +1,124 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Capture replay engine
+"""
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from tc2290.validation import Validator
+
+
+@dataclass
+class ReplayStats:
+    packets: int = 0
+    duration: float = 0.0  # Seconds
+    lateness_mean: float = 0.0  # Seconds behind schedule, on average
+    lateness_max: float = 0.0
+    _lateness_m2: float = field(default=0.0, repr=False)  # Welford's sum of squares
+
+    @property
+    def rate(self) -> float:
+        """
+        Achieved packets per second
+        """
+        return self.packets / self.duration if self.duration else 0.0
+
+    @property
+    def jitter(self) -> float:
+        """
+        Standard deviation of the lateness in seconds
+        """
+        return math.sqrt(self._lateness_m2 / self.packets) if self.packets else 0.0
+
+    def _add(self, lateness: float) -> None:
+        self.packets += 1
+        delta = lateness - self.lateness_mean
+        self.lateness_mean += delta / self.packets
+        self._lateness_m2 += delta * (lateness - self.lateness_mean)
+        if lateness > self.lateness_max:
+            self.lateness_max = lateness
+
+
+class Replayer:
+    """
+    Sends captured packets to the device with their original timing
+
+    Packets are scheduled against the monotonic clock from the start of the replay so that drift doesn't accumulate.
+    """
+    _send: Callable[[bytes], None]
+    speed: float | None
+
+    def __init__(self, send: Callable[[bytes], None], speed: float | None = 1.0) -> None:
+        """
+        :param send: Sends a message to the device. Usually TC2290.send.
+        :param speed: Time multiplier. None sends as fast as the device accepts.
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive")
+        self._send = send
+        self.speed = speed
+
+    def replay(self, packets: Iterable[tuple[float, bytes]]) -> ReplayStats:
+        """
+        :param packets: Capture timestamp in seconds and message
+        """
+        stats = ReplayStats()
+        send = self._send
+        speed = self.speed
+        clock = time.monotonic
+        sleep = time.sleep
+        start = clock()
+        origin = None
+        for timestamp, data in packets:
+            if speed is None:
+                send(data)
+                stats._add(0.0)
+                continue
+            if origin is None:
+                origin = timestamp
+            target = start + (timestamp - origin) / speed
+            delay = target - clock()
+            if delay > 0:
+                sleep(delay)
+            lateness = clock() - target
+            send(data)
+            stats._add(lateness)
+        stats.duration = clock() - start
+        return stats
+
+
+# usbrply generated scripts support (See capture/replay.py)
+
+_tc = None
+validator = Validator()
+
+
+def _device():
+    global _tc
+    if _tc is None:
+        from tc2290 import TC2290
+        _tc = TC2290()
+    return _tc
+
+
+def interruptWrite(endpoint: int, data: bytes) -> None:
+    # The device only has one OUT endpoint
+    _device().send(data)
+
+
+def interruptRead(endpoint: int, size: int, timeout_ms: int = 1000) -> bytes:
+    # The device only has one IN endpoint
+    return bytes(_device().read(timeout_ms) or b'')[:size]
+
+
+def validate_read(expected: bytes, actual: bytes, label: str) -> None:
+    """
+    Collects the reports. Compare them all at once with validator.summary().
+    """
+    validator.add(expected, actual, label)
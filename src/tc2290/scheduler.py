@@ -0,0 +1,208 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Coalescing register write scheduler
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from tc2290.metrics import Metrics
+from tc2290.protocol import Address, Chunk, Frame, Header, write_frames
+
+# Meters are refreshed constantly so they yield to everything else
+METERS = range(Address.INPUT__LEDS_L, Address.OUTPUT__LEDS_R + 1)
+
+
+@dataclass
+class SchedulerStats:
+    submitted: int = 0  # Register writes requested
+    coalesced: int = 0  # Pending writes superseded by a newer value before being sent
+    dropped: int = 0  # Writes discarded because the register already holds the value
+    frames: int = 0  # Messages sent
+
+
+class WriteScheduler:
+    """
+    Keeps the last value written to each register and sends them at a bounded frame rate
+
+    Each register has a single pending slot: the last writer wins.
+    Pending registers are grouped into as few WRITE_REG messages as possible.
+    High priority registers (Everything but the meters by default) are always sent first.
+
+    Either call drain() from the application loop or start() a background thread.
+    Registers are only considered written once their message has been sent. A failed message is queued again.
+    """
+    stats: SchedulerStats
+
+    _send: Callable[[Frame], None]
+    _period: float
+    _low_priority: frozenset[int]
+    _written: dict[int, int]
+    _pending: dict[int, int]
+    _in_flight: dict[int, int]  # Being sent
+    _lock: threading.Lock
+    _wakeup: threading.Event
+    _running: bool
+    _thread: threading.Thread | None
+
+    def __init__(
+            self,
+            send: Callable[[Frame], None],
+            rate: float = 200.0,
+            low_priority: Iterable[int] = METERS,
+            metrics: Metrics | None = None,
+    ) -> None:
+        """
+        :param send: Sends a message to the device. Usually TC2290.send.
+        :param rate: Maximum number of messages per second
+        :param low_priority: Registers sent only when no other register is pending
+        :param metrics: Where to report the number of pending registers. Usually TC2290.metrics.
+        """
+        self.stats = SchedulerStats()
+        self._send = send
+        self._period = 1 / rate
+        self._low_priority = frozenset(low_priority)
+        self._written = {}
+        self._pending = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        if metrics is not None:
+            metrics.gauge('write_queue_depth', lambda: self.pending)
+
+    def write(self, address: Address | int, value: int) -> None:
+        with self._lock:
+            self._write(address, value)
+        self._wakeup.set()
+
+    def write_many(self, registers: Iterable[tuple[Address | int, int]]) -> None:
+        with self._lock:
+            for address, value in registers:
+                self._write(address, value)
+        self._wakeup.set()
+
+    def _write(self, address: int, value: int) -> None:
+        self.stats.submitted += 1
+        written = self._in_flight.get(address, self._written.get(address))
+        if address in self._pending:
+            self.stats.coalesced += 1
+            if written == value:
+                del self._pending[address]
+                return
+        elif written == value:
+            self.stats.dropped += 1
+            return
+        self._pending[address] = value
+
+    def invalidate(self) -> None:
+        """
+        Forget what has been written to the device so that every register is written again
+        """
+        with self._lock:
+            for address, value in self._written.items():
+                self._pending.setdefault(address, value)
+            self._written.clear()
+        self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _take_frame(self) -> tuple[Frame, dict[int, int]] | None:
+        """
+        Next message and the registers it writes
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            high = [address for address in self._pending if address not in self._low_priority]
+            registers = {**self._written, **self._in_flight, **self._pending}
+            frame = write_frames(registers, high or self._pending)[0]
+            start = frame[3]
+            sent = {}
+            for address in range(start, start + (len(frame) - Header.SIZE) // Chunk.SIZE):
+                sent[address] = registers[address]
+                self._pending.pop(address, None)
+            self._in_flight.update(sent)
+            return frame, sent
+
+    def _send_frame(self, frame: Frame, registers: dict[int, int]) -> None:
+        try:
+            self._send(frame)
+        except BaseException:
+            with self._lock:
+                for address, value in registers.items():
+                    del self._in_flight[address]
+                    self._pending.setdefault(address, value)  # Unless written again in the meantime
+            raise
+        with self._lock:
+            for address, value in registers.items():
+                del self._in_flight[address]
+                self._written[address] = value
+            self.stats.frames += 1
+
+    def drain(self, limit: int | None = None) -> int:
+        """
+        Sends pending registers right away, ignoring the frame rate
+
+        :param limit: Maximum number of messages to send
+        :return: Number of messages sent
+        :raises RuntimeError: When started. The background thread sends them.
+        """
+        if self._thread is not None:
+            raise RuntimeError("started, the background thread sends the registers")
+        sent = 0
+        while limit is None or sent < limit:
+            taken = self._take_frame()
+            if taken is None:
+                break
+            self._send_frame(*taken)
+            sent += 1
+        return sent
+
+    def start(self) -> None:
+        if self._running:
+            raise RuntimeError("already started")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='TC2290 write scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the background thread. Pending registers are kept.
+        """
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        deadline = time.monotonic()
+        while self._running:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while self._running:
+                now = time.monotonic()
+                if deadline > now:
+                    time.sleep(deadline - now)
+                else:
+                    deadline = now  # Don't accumulate credit while idle
+                taken = self._take_frame()
+                if taken is None:
+                    break
+                try:
+                    self._send_frame(*taken)
+                except (OSError, ValueError):
+                    # Still pending. Retried on the next write or invalidation.
+                    logging.exception("Writing to the device failed")
+                    break
+                deadline += self._period
@@ -0,0 +1,208 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Multiple instances over one device
+
+Mimics the plugin instances sharing the device. Up to 4 instances can be registered.
+
+Messages are built like the captured ones but only a single instance has ever been captured.
+How the device tells instances apart is unknown: slots only exist on the host side.
+The device holds a single registration. Like the plugin, every instance registers the first instance's name
+and the registration is only dropped when the last instance closes.
+"""
+import threading
+from typing import Callable
+
+from tc2290.protocol import Address, Command, Event, Frame, InstanceEvent, instance_start
+from tc2290.surface import Brightness, Surface
+
+SLOTS = 4  # The plugin pings INSTANCE_FOCUS addresses 00 to 03
+
+
+class Session:
+    """
+    Instance with its own shadow surface
+
+    Changes are written to the device only while focused. Otherwise they wait for the focus.
+    """
+    slot: int
+    name: str
+    surface: Surface
+    event_callback: Callable[[Event], None] | None
+
+    _multiplexer: 'SessionMultiplexer'
+    _key: bytes  # Name as registered
+
+    def __init__(
+            self,
+            multiplexer: 'SessionMultiplexer',
+            slot: int,
+            name: str,
+            event_callback: Callable[[Event], None] | None = None,
+    ) -> None:
+        self.slot = slot
+        self.name = name
+        self.surface = Surface()
+        self.event_callback = event_callback
+        self._multiplexer = multiplexer
+        self._key = name.encode()[:InstanceEvent.NAME_SIZE]
+
+    @property
+    def focused(self) -> bool:
+        return self._multiplexer.focused is self
+
+    def focus(self) -> None:
+        self._multiplexer.focus(self.slot)
+
+    def flush(self) -> bool:
+        """
+        :return: Whether the changes were written to the device
+        """
+        return self._multiplexer._flush(self)
+
+    def close(self) -> None:
+        self._multiplexer.close(self.slot)
+
+
+class SessionMultiplexer:
+    """
+    Shares a device between instances
+
+    The device shows the focused instance's surface.
+    Switching the focus only writes the registers that differ between what the device shows and the new surface.
+    Device events go to the focused instance, except instance echoes which go to the instance they name.
+
+    Usage:
+        multiplexer = SessionMultiplexer(lambda frame: tc.send(frame))
+        tc = TC2290(event_callback=multiplexer.feed)
+        daw_a = multiplexer.open('DAW A')
+        daw_b = multiplexer.open('DAW B')
+        daw_b.surface.delay.display.from_str('120')
+        daw_b.flush()  # Kept for later
+        daw_b.focus()  # Only writes the delay display
+    """
+    sessions: list[Session | None]  # By slot
+    focused: Session | None
+
+    _send: Callable[[Frame], None]
+    _registered: bytes | None  # Name registered in the device
+    _shown: list[int | None]  # Output registers shown by the device. None is unknown.
+    _brightness_written: bool
+    _lock: threading.RLock
+
+    def __init__(self, send: Callable[[Frame], None]) -> None:
+        """
+        :param send: Sends a message to the device. Usually TC2290.send.
+        """
+        self.sessions = [None] * SLOTS
+        self.focused = None
+        self._send = send
+        self._registered = None
+        self._shown = [None] * len(Surface.OUTPUTS)
+        # Leave brightness alone until it is changed, like Surface does
+        self._shown[0] = Brightness().value
+        self._brightness_written = False
+        self._lock = threading.RLock()
+
+    def open(self, name: str, event_callback: Callable[[Event], None] | None = None) -> Session:
+        """
+        Registers an instance in the first free slot. The first one gets the focus.
+
+        :raises RuntimeError: All slots are taken
+        """
+        with self._lock:
+            try:
+                slot = self.sessions.index(None)
+            except ValueError:
+                raise RuntimeError(f"no more than {SLOTS} instances") from None
+            session = Session(self, slot, name, event_callback)
+            self.sessions[slot] = session
+            if self._registered is None:
+                self._registered = session._key
+            self._send(instance_start(self._registered))  # The first instance's name, as captured
+            if self.focused is None:
+                self.focus(slot)
+            return session
+
+    def close(self, slot: int) -> None:
+        """
+        Closes an instance. The focus goes to the next one if it had it.
+
+        The device registration is dropped with the last instance.
+        """
+        with self._lock:
+            session = self.sessions[slot]
+            if session is None:
+                return
+            self.sessions[slot] = None
+            if all(other is None for other in self.sessions):
+                self._registered = None
+                self.focused = None
+                self._send(Frame(Command.INSTANCE_STOP, data=b''))
+                return
+            if session is self.focused:
+                self.focused = None
+                for other in self.sessions:
+                    if other is not None:
+                        self.focus(other.slot)
+                        break
+
+    def focus(self, slot: int) -> None:
+        """
+        Shows an instance's surface on the device
+        """
+        with self._lock:
+            session = self.sessions[slot]
+            if session is None:
+                raise KeyError(f"no instance in slot {slot}")
+            if session is self.focused:
+                return
+            self.focused = session
+            # Unverified: the captured plugin pings every address from a single instance
+            self._send(Frame(Command.INSTANCE_FOCUS, address=slot, data=b''))
+            self._write(session.surface.sync(self._shown))
+            self._shown = session.surface.registers()
+
+    def invalidate(self) -> None:
+        """
+        Forget what the device shows so that the next focus or flush rewrites everything
+
+        Brightness is still left alone unless it has been written before.
+        """
+        with self._lock:
+            brightness = None if self._brightness_written else self._shown[0]
+            self._shown = [None] * len(self._shown)
+            self._shown[0] = brightness
+            if self.focused is not None:
+                self.focused.surface.invalidate()
+
+    def _flush(self, session: Session) -> bool:
+        with self._lock:
+            if session is not self.focused:
+                return False
+            self._write(session.surface.flush())
+            self._shown = session.surface.registers()
+            return True
+
+    def _write(self, frames: list[Frame]) -> None:
+        for frame in frames:
+            if frame[3] == Address.GLOBAL__BRIGHTNESS:
+                self._brightness_written = True
+            self._send(frame)
+
+    def feed(self, event: Event) -> None:
+        """
+        Event callback
+        """
+        session = None
+        if isinstance(event, InstanceEvent):
+            name = event.data[InstanceEvent.NAME_OFFSET:InstanceEvent.NAME_OFFSET + InstanceEvent.NAME_SIZE]
+            name = name.rstrip(b'\x00')
+            session = next((s for s in self.sessions if s is not None and s._key == name), None)
+        if session is None:
+            session = self.focused
+        if session is not None and session.event_callback is not None:
+            session.event_callback(event)
@@ -0,0 +1,170 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Simulated device
+
+Implements the protocol as documented in the README for hardware-free testing and benchmarking.
+
+Usage:
+    device = SimulatedTC2290()
+    tc = TC2290(transport=device)
+    device.click(Address.DELAY__UP)
+"""
+import queue
+import random
+import struct
+
+from tc2290.protocol import Address, Command, Header, Message
+
+
+class SimulatedTC2290:
+    """
+    In-process stand-in for hid.device opened on a TC2290
+    """
+    VERSION = b'1.0.0.4-358'
+    REGISTERS = 256
+    REGISTER_SIZE = 4
+
+    # Word replied at byte 8 to INSTANCE_FOCUS by slot, as captured
+    _FOCUS_REPLY = (0x00, 0x00, Address.GLOBAL__BRIGHTNESS, Address.MODULATION__SPEED_UP)
+    _BUTTON_HEADER = bytes.fromhex('0c080000ffffffff')
+    _BUTTON_GIBBERISH = 52
+
+    registers: bytearray
+    instance_name: bytes | None
+    _replies: queue.Queue
+    _nonblocking: bool
+    _connected: bool
+    _random: random.Random
+
+    def __init__(self, seed: int | None = None) -> None:
+        """
+        :param seed: Makes the button reports gibberish reproducible
+        """
+        self.registers = bytearray(self.REGISTERS * self.REGISTER_SIZE)
+        self.registers[0x00:0x04] = bytes.fromhex('02000300')  # As captured
+        self.registers[0x01 * self.REGISTER_SIZE] = 0x71  # Product ID
+        offset = Address.VERSION * self.REGISTER_SIZE
+        self.registers[offset:offset + len(self.VERSION)] = self.VERSION
+        self.instance_name = None
+        self._replies = queue.Queue()
+        self._nonblocking = False
+        self._connected = True
+        self._random = random.Random(seed)
+        self._dispatch = {
+            Command.INSTANCE_START: self._instance_start,
+            Command.INSTANCE_STOP: self._instance_stop,
+            Command.INSTANCE_FOCUS: self._instance_focus,
+            Command.READ_REG: self._read_reg,
+            Command.WRITE_REG: self._write_reg,
+        }
+
+    # hid.device interface
+
+    def open(self, vendor_id: int = 0, product_id: int = 0, serial_number: str | None = None) -> None:
+        pass
+
+    def open_path(self, path: bytes) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def set_nonblocking(self, value: bool | int) -> int:
+        self._nonblocking = bool(value)
+        return 0
+
+    def read(self, max_length: int, timeout_ms: int = 0) -> list[int]:
+        if not self._connected:
+            raise OSError("read error")
+        try:
+            if timeout_ms > 0:
+                report = self._replies.get(timeout=timeout_ms / 1000)
+            elif self._nonblocking:
+                report = self._replies.get_nowait()
+            else:
+                report = self._replies.get()
+        except queue.Empty:
+            return []
+        if report is None:
+            raise OSError("read error")
+        return list(report[:max_length])
+
+    def write(self, buff) -> int:
+        if not self._connected:
+            raise OSError("write error")
+        report = bytes(buff)
+        message = report[1:].ljust(Message.MAX_SIZE, b'\x00')  # Skip the report ID
+        handler = self._dispatch.get(message[0])
+        if handler:
+            handler(message)
+        return len(report)
+
+    # Device behavior
+
+    def unplug(self) -> None:
+        """
+        Every subsequent read and write fails, like hidapi does once the device is gone
+        """
+        self._connected = False
+        self._replies.put(None)  # Wakes up a blocked reader
+
+    def register(self, address: int) -> int:
+        return struct.unpack_from('<I', self.registers, address * self.REGISTER_SIZE)[0]
+
+    def _instance_start(self, message: bytes) -> None:
+        self.instance_name = message[Header.SIZE:Header.SIZE + 43].rstrip(b'\x00')
+        reply = bytearray(message)
+        reply[52] = 0x02
+        reply[53] = 0x01
+        self._replies.put(bytes(reply))
+
+    def _instance_stop(self, message: bytes) -> None:
+        self.instance_name = None
+
+    def _instance_focus(self, message: bytes) -> None:
+        slot = message[3]
+        reply = bytearray(message)
+        struct.pack_into('<I', reply, Header.SIZE, self._FOCUS_REPLY[slot] if slot < len(self._FOCUS_REPLY) else 0)
+        self._replies.put(bytes(reply))
+
+    def _read_reg(self, message: bytes) -> None:
+        size, address = message[1], message[3]
+        offset = address * self.REGISTER_SIZE
+        payload = self.registers[offset:offset + size].ljust(size, b'\x00')
+        reply = bytearray(message)
+        reply[Header.SIZE:Header.SIZE + size] = payload
+        self._replies.put(bytes(reply))
+
+    def _write_reg(self, message: bytes) -> None:
+        # Every register covered by the message size is written, padding included.
+        # That's how an oversized message resets the elements that follow in the block.
+        size, address = message[1], message[3]
+        count = min(size // self.REGISTER_SIZE, self.REGISTERS - address)
+        offset = address * self.REGISTER_SIZE
+        self.registers[offset:offset + count * self.REGISTER_SIZE] = \
+            message[Header.SIZE:Header.SIZE + count * self.REGISTER_SIZE]
+
+    # Buttons
+
+    def _button(self, address: Address) -> None:
+        report = (
+                self._BUTTON_HEADER
+                + struct.pack('<I', address)
+                + self._random.randbytes(self._BUTTON_GIBBERISH)
+        )
+        self._replies.put(report)
+
+    def press(self, address: Address) -> None:
+        self._button(address)
+
+    def release(self, address: Address) -> None:
+        # Same report as the press
+        self._button(address)
+
+    def click(self, address: Address) -> None:
+        self.press(address)
+        self.release(address)
@@ -0,0 +1,209 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Hot-plug supervisor
+"""
+import logging
+import threading
+from typing import Callable
+
+from tc2290 import TC2290, Transport
+from tc2290.manager import enumerate_devices, open_path
+from tc2290.protocol import Event, Frame, Message
+from tc2290.surface import Surface
+
+
+class Supervisor:
+    """
+    Keeps a TC2290 connected across unplugs
+
+    The surface belongs to the supervisor and outlives the connections.
+    Once the device is back, the instance is registered again and the whole surface is written back.
+    Changes made while disconnected are kept and written on reconnection.
+
+    Usage:
+        supervisor = Supervisor(event_callback=on_event, instance_name='Session')
+        supervisor.start()
+        supervisor.surface.delay.display.from_str('120')
+        supervisor.flush()
+    """
+    surface: Surface
+    tc: TC2290 | None
+    connections: int  # Successful connections, the first one included
+
+    _connect: Callable[[], Transport]
+    _instance_name: str
+    _event_callback: Callable[[Event], None] | None
+    _receive_callback: Callable[[list], None] | None
+    _backoff: tuple[float, float]
+    _lock: threading.Lock
+    _lost: threading.Event
+    _connected: threading.Event
+    _running: bool
+    _thread: threading.Thread | None
+
+    def __init__(
+            self,
+            event_callback: Callable[[Event], None] | None = None,
+            receive_callback: Callable[[list], None] | None = None,
+            instance_name: str = '',
+            serial_number: str | None = None,
+            connect: Callable[[], Transport] | None = None,
+            backoff: tuple[float, float] = (0.05, 0.5),
+    ) -> None:
+        """
+        :param instance_name: Registered on each connection. The device is just woken up when empty.
+        :param serial_number: Device to follow. Defaults to the first supported device found.
+        :param connect: Opens the device or raises OSError. Overrides serial_number.
+        :param backoff: First and maximum delay in seconds between connection attempts. Doubles on each failure.
+        """
+        self.surface = Surface()
+        self.tc = None
+        self.connections = 0
+        self._connect = connect or (lambda: self._open(serial_number))
+        self._instance_name = instance_name
+        self._event_callback = event_callback
+        self._receive_callback = receive_callback
+        self._backoff = backoff
+        self._lock = threading.Lock()
+        self._lost = threading.Event()
+        self._connected = threading.Event()
+        self._running = False
+        self._thread = None
+
+    @staticmethod
+    def _open(serial_number: str | None) -> Transport:
+        for info in enumerate_devices():
+            if serial_number is None or info.serial_number == serial_number:
+                return open_path(info.path)
+        raise OSError("no device found")
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def wait_connected(self, timeout: float | None = None) -> bool:
+        return self._connected.wait(timeout)
+
+    def start(self) -> None:
+        if self._running:
+            raise RuntimeError("already started")
+        self._running = True
+        self._lost.set()  # Connect right away
+        self._thread = threading.Thread(target=self._run, name='TC2290 supervisor', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops supervising and releases the device
+        """
+        self._running = False
+        self._lost.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._disconnect()
+
+    def send(self, data: Frame | Message | list) -> bool:
+        """
+        Sends a message if the device is connected
+
+        :return: Whether it was sent
+        """
+        with self._lock:
+            if self.tc is None or not self._connected.is_set():
+                return False
+            try:
+                self.tc.send(data)
+            except (OSError, ValueError) as error:
+                self._on_disconnect(error)
+                return False
+        return True
+
+    def flush(self) -> bool:
+        """
+        Writes the surface registers that changed since the last flush
+
+        While disconnected, changes are kept until the device is back.
+
+        :return: Whether the device is up-to-date
+        """
+        with self._lock:
+            if self.tc is None or not self._connected.is_set():
+                return False
+            try:
+                self.tc.flush()
+            except (OSError, ValueError) as error:
+                self._on_disconnect(error)
+                return False
+        return True
+
+    def _on_disconnect(self, error: Exception) -> None:
+        # Called from the reader thread or while sending
+        if self._connected.is_set():
+            logging.warning("Device lost: %s", error)
+        self._connected.clear()
+        self._lost.set()
+
+    def _disconnect(self) -> None:
+        with self._lock:
+            self._connected.clear()
+            tc, self.tc = self.tc, None
+        if tc is not None:
+            try:
+                tc.close()
+            except (OSError, ValueError):
+                pass  # Already gone
+
+    def _reconnect(self) -> bool:
+        try:
+            transport = self._connect()
+        except (OSError, ValueError):
+            return False
+        tc = TC2290(
+            receive_callback=self._receive_callback,
+            event_callback=self._event_callback,
+            transport=transport,
+            disconnect_callback=self._on_disconnect,
+        )
+        tc.surface = self.surface
+        with self._lock:
+            try:
+                if self._instance_name:
+                    tc.instance(self._instance_name)
+                else:
+                    tc.wakeup()
+                # The device may have been power cycled: write everything again in as few messages as possible
+                self.surface.invalidate()
+                tc.flush()
+            except (OSError, ValueError):
+                self.surface.invalidate()  # Some writes may not have made it
+                try:
+                    tc.close()
+                except (OSError, ValueError):
+                    pass
+                return False
+            self.tc = tc
+            self._lost.clear()
+            tc.start()
+            self._connected.set()
+        return True
+
+    def _run(self) -> None:
+        first, maximum = self._backoff
+        while self._running:
+            self._lost.wait()
+            if not self._running:
+                break
+            self._disconnect()
+            delay = first
+            while self._running and not self._reconnect():
+                self._lost.clear()
+                self._lost.wait(delay)  # Woken up early by stop()
+                delay = min(2 * delay, maximum)
+            if self._running:
+                self.connections += 1
+                logging.info("Device connected")
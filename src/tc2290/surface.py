@@ -3,12 +3,14 @@
 # SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
-import itertools
-from collections.abc import Iterable
+import struct
+from collections import OrderedDict
+from collections.abc import Hashable, Mapping, Sequence
 from dataclasses import dataclass
 from enum import Flag, auto, Enum
+from types import MappingProxyType
 
-from tc2290 import Address
+from tc2290.protocol import Address, Command, Frame, write_frames
 
 
 class BrightnessStrengthDescriptor:
@@ -52,11 +54,54 @@ class LedColor(Flag):
     RED = auto()
 
 
-@dataclass
 class Led:
-    color: LedColor = LedColor.RED
-    state: bool = False
-    address: Address | None = None
+    """
+    Single led
+
+    Either holds its own state or is a view on one bit of a LedMap.
+    """
+    __slots__ = ('color', 'address', '_state', '_map', '_bit')
+
+    color: LedColor
+    address: Address | None
+
+    def __init__(
+            self,
+            color: LedColor = LedColor.RED,
+            state: bool = False,
+            address: Address | None = None,
+            *,
+            _map: 'LedMap | None' = None,
+            _index: int = 0,
+    ):
+        self.color = color
+        self.address = address
+        self._state = state
+        self._map = _map
+        self._bit = 1 << _index
+
+    @property
+    def state(self) -> bool:
+        if self._map is None:
+            return self._state
+        return bool(self._map._bits & self._bit)
+
+    @state.setter
+    def state(self, state: bool):
+        if self._map is None:
+            self._state = state
+        elif state:
+            self._map._bits |= self._bit
+        else:
+            self._map._bits &= ~self._bit
+
+    @property
+    def value(self) -> int:
+        return int(self.state)
+
+    @value.setter
+    def value(self, value: int):
+        self.state = bool(value)
 
     def toggle(self):
         self.state = not self.state
@@ -67,6 +112,16 @@ class Led:
     def off(self):
         self.state = False
 
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.color, self.state, self.address) == (other.color, other.state, other.address)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(color={self.color!r}, state={self.state!r}, address={self.address!r})'
+
 
 @dataclass
 class Button:
@@ -74,18 +129,64 @@ class Button:
     address: Address | None = None
 
 
+class LedViews(Sequence):
+    """
+    Leds of a LedMap, created on access
+    """
+    __slots__ = ('_map',)
+
+    def __init__(self, led_map: 'LedMap'):
+        self._map = led_map
+
+    def __len__(self) -> int:
+        return self._map.size
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        size = self._map.size
+        if item < 0:
+            item += size
+        if not 0 <= item < size:
+            raise IndexError("index out of range")
+        colors = self._map._COLORS
+        return Led(colors[item] if item < len(colors) else LedColor.RED, _map=self._map, _index=item)
+
+
 class LedMap:
-    leds: list[Led]
+    """
+    Leds sharing a register
+
+    The state is held in a single integer bitmap. First led is LSB.
+    """
+    _COLORS: tuple[LedColor, ...] = ()  # By led. Defaults to red.
+
+    size: int
     address: Address
+    _bits: int
 
     def __init__(self, size: int, address: Address = None):
         if size not in (2, 3, 4, Digit.SIZE, BarGraph.SIZE):
             raise ValueError
-        self.leds = []
-        for _ in range(size):
-            self.leds.append(Led())
+        self.size = size
+        self._bits = 0
         self.address = address
 
+    @property
+    def leds(self) -> LedViews:
+        return LedViews(self)
+
+    @property
+    def value(self) -> int:
+        """
+        Register bitmap. First led is LSB.
+        """
+        return self._bits
+
+    @value.setter
+    def value(self, value: int):
+        self._bits = value & ((1 << self.size) - 1)
+
 
 class MeterDirection(Enum):
     INPUT = auto()
@@ -118,17 +219,12 @@ class BarGraph(LedMap):
     minus_3: Led
     zero: Led
 
+    _COLORS = (LedColor.GREEN,) * _SIZE_GREEN + (LedColor.YELLOW,) * _SIZE_YELLOW + (LedColor.RED,) * _SIZE_RED
+
     def __init__(self, direction: MeterDirection, side: MeterSide, address: Address):
         self.direction = direction
         self.side = side
         super().__init__(self.SIZE, address)
-        for i in range(0, self.SIZE):
-            for _ in range(0, self._SIZE_GREEN):
-                self.leds[i].color = LedColor.GREEN
-            for _ in range(0, self._SIZE_YELLOW):
-                self.leds[i].color = LedColor.YELLOW
-            for _ in range(0, self._SIZE_RED):
-                self.leds[i].color = LedColor.RED
 
     @property
     def minus_60(self):
@@ -186,7 +282,7 @@ class StereoBarGraph:
 
 class SevenSegmentFont:
     _SEVEN_SEGMENT_FONT = {
-        # Format: a, b, c, d, e, f
+        # Format: a, b, c, d, e, f, g
         0: (True, True, True, True, True, True, False),
         1: (False, True, True, False, False, False, False),
         2: (True, True, False, True, True, False, True),
@@ -209,6 +305,22 @@ class SevenSegmentFont:
     for i in range(0, 0x10):
         _SEVEN_SEGMENT_FONT[f'{i:X}'] = _SEVEN_SEGMENT_FONT[i]
 
+    # Segments bitmask (a is LSB) by ASCII code. -1 when not supported.
+    _MASK_BY_CODE = [-1] * 128
+    # Glyphs by segments bitmask
+    _INT_BY_MASK = {}
+    _STR_BY_MASK = {}
+    for key, state in _SEVEN_SEGMENT_FONT.items():
+        mask = sum(1 << segment for segment, on in enumerate(state) if on)
+        if isinstance(key, int):
+            _INT_BY_MASK[mask] = key
+        else:
+            _STR_BY_MASK[mask] = key
+            _MASK_BY_CODE[ord(key)] = mask
+            _MASK_BY_CODE[ord(key.lower())] = mask
+    _MASK_BY_CODE = tuple(_MASK_BY_CODE)
+    del i, key, state, mask
+
     def __len__(self):
         return len(self._SEVEN_SEGMENT_FONT)
 
@@ -219,19 +331,40 @@ class SevenSegmentFont:
         return self._SEVEN_SEGMENT_FONT.items()
 
     @classmethod
-    def key_from_state(cls, state: tuple, class_filter: int | str = int) -> int | str | None:
-        for key, font_state in cls._SEVEN_SEGMENT_FONT.items():
-            if isinstance(key, class_filter) and font_state == state:
-                return key
+    def encode(cls, char: str) -> int:
+        """
+        Segments bitmask of a character
+        """
+        code = ord(char)
+        mask = cls._MASK_BY_CODE[code] if code < 128 else -1
+        if mask < 0:
+            raise ValueError("character not supported")
+        return mask
+
+    @classmethod
+    def decode(cls, mask: int, class_filter: int | str = str) -> int | str | None:
+        """
+        Glyph from a segments bitmask
+        """
         if class_filter == str:
-            return ''
-        return None
+            return cls._STR_BY_MASK.get(mask, '')
+        return cls._INT_BY_MASK.get(mask)
+
+    @classmethod
+    def key_from_state(cls, state: tuple, class_filter: int | str = int) -> int | str | None:
+        mask = 0
+        for segment, on in enumerate(state):
+            if on:
+                mask |= 1 << segment
+        return cls.decode(mask, class_filter)
 
 
 class Digit(LedMap):
     _SEGMENTS = 7
     _DOT = 1
     SIZE = _SEGMENTS + _DOT
+    SEGMENTS_MASK = (1 << _SEGMENTS) - 1
+    DOT_MASK = 1 << _SEGMENTS
 
     a: Led  # Top
     b: Led  # Right, top
@@ -277,62 +410,88 @@ class Digit(LedMap):
     def dot(self):
         return self.leds[7]
 
+    @staticmethod
+    def encode(value: str) -> int:
+        """
+        Register value of a character optionally followed by a dot
+        """
+        if not isinstance(value, str):
+            raise TypeError("not a string")
+        if len(value) == 2 and value[1] == '.':
+            return SevenSegmentFont.encode(value[0]) | Digit.DOT_MASK
+        if len(value) != 1:
+            raise ValueError("only support one character or two with the second being a dot")
+        return SevenSegmentFont.encode(value)
+
     def from_int(self, value: int):
         if not isinstance(value, int):
             raise TypeError("not an int")
-        digit = SevenSegmentFont()[value]
-        for i, segment in enumerate(digit):
-            self.leds[i].state = segment
+        if value not in range(0x10):
+            raise KeyError(value)
+        self.value = self.value & self.DOT_MASK | SevenSegmentFont.encode(f'{value:X}')
 
     def from_str(self, value: str):
-        dot = False
-        if not isinstance(value, str):
-            raise TypeError("not a string")
-        if len(value) > 1:
-            if value[1] != '.' or len(value) > 2:
-                raise ValueError("only support one character or two with the second being a dot")
-            if value[1] == '.':
-                value = value[0]
-                dot = True
-        if ord(value) not in itertools.chain(range(ord('0'), ord('9')), range(ord('A'), ord('F'))):
-            raise ValueError("character not supported")
-        digit = SevenSegmentFont()[value]
-        for i, segment in enumerate(digit):
-            self.leds[i].state = segment
-        self.dot.state = dot
-
-    def _segments_state(self) -> tuple:
-        return (
-            self.a.state,
-            self.b.state,
-            self.c.state,
-            self.d.state,
-            self.e.state,
-            self.f.state,
-            self.g.state,
-        )
+        self.value = self.encode(value)
 
     def to_int(self) -> int | None:
-        current_state = self._segments_state()
-        return SevenSegmentFont.key_from_state(current_state, int)
+        return SevenSegmentFont.decode(self.value & self.SEGMENTS_MASK, int)
 
     def to_str(self) -> str:
-        current_state = self._segments_state()
-        value = SevenSegmentFont.key_from_state(current_state, str)
-        if self.dot.state:
-            value += '.'
-        return value
+        value = self.value
+        text = SevenSegmentFont.decode(value & self.SEGMENTS_MASK, str)
+        if value & self.DOT_MASK:
+            text += '.'
+        return text
 
 
 class Display:
     digits: list[Digit]
 
-    def __init__(self, size: int):
+    def __init__(self, size: int, numbered_from_right: bool = False):
+        """
+        :param numbered_from_right: The first digit is the rightmost one
+        """
         if size not in (2, 4):
             raise ValueError
         self.digits = []
         for _ in range(size):
             self.digits.append(Digit())
+        self._numbered_from_right = numbered_from_right
+
+    def _left_to_right(self) -> list[Digit]:
+        return self.digits[::-1] if self._numbered_from_right else self.digits
+
+    @classmethod
+    def encode(cls, value: str, size: int) -> list[int]:
+        """
+        Register values from left to right. Dots attach to the preceding character. Right aligned.
+        """
+        values = []
+        for char in value:
+            if char == '.':
+                if values and not values[-1] & Digit.DOT_MASK:
+                    values[-1] |= Digit.DOT_MASK
+                else:
+                    values.append(Digit.DOT_MASK)
+            else:
+                values.append(SevenSegmentFont.encode(char))
+        if len(values) > size:
+            raise ValueError(f"display only has {size} digits")
+        return [0x00] * (size - len(values)) + values
+
+    def from_str(self, value: str):
+        for digit, digit_value in zip(self._left_to_right(), self.encode(value, len(self.digits))):
+            digit.value = digit_value
+
+    def to_str(self) -> str:
+        return ''.join(digit.to_str() for digit in self._left_to_right())
+
+    def frame(self) -> Frame:
+        """
+        WRITE_REG message updating the whole display
+        """
+        digits = sorted(self.digits, key=lambda digit: digit.address)
+        return Frame.from_words(Command.WRITE_REG, digits[0].address, [digit.value for digit in digits])
 
 
 # ---
@@ -476,7 +635,7 @@ class Delay:
 
     def __init__(self):
         self.time = Led(color=LedColor.RED, address=Address.DELAY__LED_TIME)
-        self.display = Display(self._DISPLAY_SIZE)
+        self.display = Display(self._DISPLAY_SIZE, numbered_from_right=True)
         self.display.digits[0].address = Address.DELAY__DIGIT_1
         self.display.digits[1].address = Address.DELAY__DIGIT_2
         self.display.digits[2].address = Address.DELAY__DIGIT_3
@@ -511,7 +670,7 @@ class Feedback:
         self.display = Display(self._DISPLAY_SIZE)
         self.display.digits[0].address = Address.FEEDBACK__DIGIT_1
         self.display.digits[1].address = Address.FEEDBACK__DIGIT_2
-        self.select = LedMap(self._SELECT_OPTIONS)
+        self.select = LedMap(self._SELECT_OPTIONS, address=Address.FEEDBACK__LEDS_SELECT)
         self.feedback = Led(color=LedColor.GREEN, address=Address.FEEDBACK__LED_F_BACK)
         self.feedback_up = Button(address=Address.FEEDBACK__UP)
         self.feedback_down = Button(address=Address.FEEDBACK__DOWN)
@@ -555,7 +714,7 @@ class PresetSpec:
         self.preset = Led(color=LedColor.GREEN, address=Address.PRESET_SPEC__LED_PRESET)
         self.preset_up = Button(address=Address.PRESET_SPEC__PRESET_UP)
         self.preset_down = Button(address=Address.PRESET_SPEC__PRESET_DOWN)
-        self.delay_on = Led(color=LedColor.RED, address=Address.DELAY__LED_DELAY_ON)
+        self.delay_on = Led(color=LedColor.RED, address=Address.PRESET_SPEC__LED_DELAY_ON)
         self.delay = Button(address=Address.PRESET_SPEC__DELAY)
         self.mix_spec_toggle = Button(address=Address.PRESET_SPEC__MIX_SPEC)
 
@@ -597,86 +756,232 @@ class Keyboard:
         self.enter = Button(address=Address.KEYBOARD__ENTER)
 
 
+# Element of each address, as a path of attributes from the surface. Integers index sequences.
+LAYOUT: Mapping[Address, str] = MappingProxyType({
+    # Outputs
+    Address.GLOBAL__BRIGHTNESS: 'brightness',
+    Address.INPUT__LEDS_L: 'meters.input.left',
+    Address.INPUT__LEDS_R: 'meters.input.right',
+    Address.OUTPUT__LEDS_L: 'meters.output.left',
+    Address.OUTPUT__LEDS_R: 'meters.output.right',
+    Address.MODULATION__LED_OSC_THRESHOLD: 'modulation.osc_threshold',
+    Address.MODULATION__LED_DISPLAY_LEFT: 'modulation.display_left',
+    Address.MODULATION__DIGIT_2: 'modulation.display.digits.1',
+    Address.MODULATION__DIGIT_1: 'modulation.display.digits.0',
+    Address.MODULATION__LEDS_WAVE_FORM: 'modulation.wave_form',
+    Address.MODULATION__LEDS_SELECT: 'modulation.select',
+    Address.MODULATION__LED_SPEED: 'modulation.speed',
+    Address.MODULATION__LED_DEPTH: 'modulation.depth',
+    Address.PAN_DYN__LED_PAN_MOD: 'pan_dyn.pan.mod',
+    Address.PAN_DYN__LED_DYN_MOD: 'pan_dyn.dyn.mod',
+    Address.PAN_DYN__LED_DELAY: 'pan_dyn.pan.delay',
+    Address.PAN_DYN__LED_DIRECT: 'pan_dyn.pan.direct',
+    Address.PAN_DYN__LED_REVERSE: 'pan_dyn.dyn.reverse',
+    Address.DELAY__LED_TIME: 'delay.time',
+    Address.DELAY__DIGIT_4: 'delay.display.digits.3',
+    Address.DELAY__DIGIT_3: 'delay.display.digits.2',
+    Address.DELAY__DIGIT_2: 'delay.display.digits.1',
+    Address.DELAY__DIGIT_1: 'delay.display.digits.0',
+    Address.DELAY__LED_DELAY_ON: 'delay.delay',
+    Address.DELAY__LED_MOD: 'delay.mod',
+    Address.DELAY__LED_SYNC: 'delay.sync',
+    Address.FEEDBACK__DIGIT_2: 'feedback.display.digits.1',
+    Address.FEEDBACK__DIGIT_1: 'feedback.display.digits.0',
+    Address.FEEDBACK__LEDS_SELECT: 'feedback.select',
+    Address.FEEDBACK__LED_F_BACK: 'feedback.feedback',
+    Address.FEEDBACK__LED_INV: 'feedback.inv',
+    Address.PRESET_SPEC__DIGIT_2: 'preset_spec.display.digits.1',
+    Address.PRESET_SPEC__DIGIT_1: 'preset_spec.display.digits.0',
+    Address.PRESET_SPEC__LEDS_MIX_SPEC: 'preset_spec.mix_spec',
+    Address.PRESET_SPEC__LED_PRESET: 'preset_spec.preset',
+    Address.PRESET_SPEC__LED_DELAY_ON: 'preset_spec.delay_on',
+    # Inputs
+    Address.MODULATION__SPEED_UP: 'modulation.speed_up',
+    Address.MODULATION__SPEED_DOWN: 'modulation.speed_down',
+    Address.MODULATION__DEPTH_UP: 'modulation.depth_up',
+    Address.MODULATION__DEPTH_DOWN: 'modulation.depth_down',
+    Address.MODULATION__WAVE_FORM: 'modulation.wave_form_toggle',
+    Address.MODULATION__SELECT: 'modulation.select_toggle',
+    Address.PAN_DYN__PAN_MOD: 'pan_dyn.pan.mod_toggle',
+    Address.PAN_DYN__DYN_MOD: 'pan_dyn.dyn.mod_toggle',
+    Address.PAN_DYN__DELAY_DIRECT: 'pan_dyn.pan.delay_direct_toggle',
+    Address.PAN_DYN__REVERSE: 'pan_dyn.dyn.reverse_toggle',
+    Address.DELAY__UP: 'delay.delay_up',
+    Address.DELAY__DOWN: 'delay.delay_down',
+    Address.DELAY__MOD: 'delay.mod_toggle',
+    Address.DELAY__SYNC: 'delay.sync_toggle',
+    Address.DELAY__LEARN: 'delay.learn',
+    Address.FEEDBACK__UP: 'feedback.feedback_up',
+    Address.FEEDBACK__DOWN: 'feedback.feedback_down',
+    Address.FEEDBACK__INV: 'feedback.inv_toggle',
+    Address.FEEDBACK__SELECT: 'feedback.select_toggle',
+    Address.PRESET_SPEC__PRESET_UP: 'preset_spec.preset_up',
+    Address.PRESET_SPEC__PRESET_DOWN: 'preset_spec.preset_down',
+    Address.PRESET_SPEC__DELAY: 'preset_spec.delay',
+    Address.PRESET_SPEC__MIX_SPEC: 'preset_spec.mix_spec_toggle',
+    Address.KEYBOARD__7: 'keyboard.seven',
+    Address.KEYBOARD__8: 'keyboard.eight',
+    Address.KEYBOARD__9: 'keyboard.nine',
+    Address.KEYBOARD__4: 'keyboard.four',
+    Address.KEYBOARD__5: 'keyboard.five',
+    Address.KEYBOARD__6: 'keyboard.six',
+    Address.KEYBOARD__1: 'keyboard.one',
+    Address.KEYBOARD__2: 'keyboard.two',
+    Address.KEYBOARD__3: 'keyboard.three',
+    Address.KEYBOARD__0: 'keyboard.zero',
+    Address.KEYBOARD__DOT: 'keyboard.dot',
+    Address.KEYBOARD__ENTER: 'keyboard.enter',
+})
+
+
+def _compile(path: str) -> tuple[str | int, ...]:
+    return tuple(int(step) if step.isdigit() else step for step in path.split('.'))
+
+
 class Surface:
-    brightness = Brightness()
-    meters = Meters()
-    modulation = Modulation()
-    pan_dyn = PanDyn()
-    delay = Delay()
-    feedback = Feedback()
-    preset_spec = PresetSpec()
-    keyboard = Keyboard()
+    # Output registers
+    OUTPUTS = range(Address.GLOBAL__BRIGHTNESS, Address.PRESET_SPEC__LED_DELAY_ON + 1)
+    # Snapshot of the output registers. None of them is wider than 16 bits.
+    SNAPSHOT = struct.Struct(f'<{len(OUTPUTS)}H')
+    # Compiled once for all surfaces
+    _PATHS = MappingProxyType({address: _compile(path) for address, path in LAYOUT.items()})
+
+    brightness: Brightness
+    meters: Meters
+    modulation: Modulation
+    pan_dyn: PanDyn
+    delay: Delay
+    feedback: Feedback
+    preset_spec: PresetSpec
+    keyboard: Keyboard
+
+    address_map: Mapping[Address, Brightness | Led | LedMap | Button]
 
     def __init__(self):
-        self._addresses_by_path = self._seek_address()
-        self.address_map = self._map_addresses(self._addresses_by_path)
-
-    def _seek_address(self, obj=None, root=None):
-        addresses = {}
-        if obj is None:
-            obj = self
-        if root is None:
-            root = self.__class__.__name__
-        for element in obj.__dir__():
-            if element.startswith('_'):
-                continue
-
-            if element in (
-                    'clear',
-                    'copy',
-                    'append',
-                    'insert',
-                    'extend',
-                    'pop',
-                    'remove',
-                    'index',
-                    'count',
-                    'reverse',
-                    'sort',
-            ):
-                continue
-
-            try:
-                addresses[root]
-            except KeyError:
-                addresses[root] = {}
-
-            if hasattr(obj, 'address'):
-                address = getattr(obj, 'address')
-                if address:
-                    addresses[root] = address
-            else:
-                next_obj = getattr(obj, element)
-                if isinstance(next_obj, Iterable):
-                    for i, sub_obj in enumerate(next_obj):
-                        addresses[root][i] = {}
-                        addresses[root][i].update(self._seek_address(sub_obj, i))
-                else:
-                    addresses[root].update(self._seek_address(next_obj, element))
-
-        return addresses
-
-    def _map_addresses(self, addr, prev_path=None):
-        flipped = {}
-        path = None
-        for key, val in addr.items():
-            if key == self.__class__.__name__:
-                path = self
-            if prev_path:
-                if isinstance(key, int):
-                    if hasattr(prev_path, 'digits'):
-                        path = prev_path.digits[key]
-                    elif hasattr(prev_path, 'leds'):
-                        path = prev_path.leds[key]
-                    else:
-                        print(prev_path)
-                else:
-                    path = getattr(prev_path, key)
-            if isinstance(val, Address):
-                if not path:
-                    raise RuntimeError("path not found. This should not happen")
-                flipped[val] = path
-                continue
-            else:
-                flipped.update(self._map_addresses(addr[key], path))
-        return flipped
+        self.brightness = Brightness()
+        self.meters = Meters()
+        self.modulation = Modulation()
+        self.pan_dyn = PanDyn()
+        self.delay = Delay()
+        self.feedback = Feedback()
+        self.preset_spec = PresetSpec()
+        self.keyboard = Keyboard()
+        self.address_map = MappingProxyType({address: self._resolve(path) for address, path in self._PATHS.items()})
+        self._outputs = [self.address_map[address] for address in self.OUTPUTS]
+        # Last values written to the device. None is unknown.
+        self._written = [None] * len(self.OUTPUTS)
+        # Leave brightness alone until it is changed, like TC2290.all() and TC2290.none()
+        self._written[0] = self.brightness.value
+        self._brightness_written = False
+
+    def _resolve(self, path: tuple[str | int, ...]):
+        element = self
+        for step in path:
+            element = element[step] if isinstance(step, int) else getattr(element, step)
+        return element
+
+    def registers(self) -> list[int]:
+        """
+        Current output registers values, starting at GLOBAL__BRIGHTNESS
+        """
+        return [element.value for element in self._outputs]
+
+    def snapshot(self) -> bytes:
+        """
+        Every output register, packed in SNAPSHOT.size bytes
+        """
+        return self.SNAPSHOT.pack(*self.registers())
+
+    def restore(self, snapshot: bytes) -> list[Frame]:
+        """
+        Sets the surface back to a snapshot
+
+        :return: WRITE_REG messages updating the device with the registers that changed since the last flush
+        """
+        for element, value in zip(self._outputs, self.SNAPSHOT.unpack(snapshot)):
+            if element.value != value:
+                element.value = value
+        return self.flush()
+
+    def dirty(self) -> list[Address]:
+        """
+        Output registers that changed since the last flush
+        """
+        return [
+            Address(address)
+            for address, value, written in zip(self.OUTPUTS, self.registers(), self._written)
+            if value != written
+        ]
+
+    def invalidate(self) -> None:
+        """
+        Forget what has been written to the device so that the next flush rewrites everything
+
+        Brightness is only rewritten if it has been written before. Otherwise it is still left alone.
+        """
+        brightness = None if self._brightness_written else self._written[0]
+        self._written = [None] * len(self.OUTPUTS)
+        self._written[0] = brightness
+
+    def sync(self, written: Sequence[int | None]) -> list[Frame]:
+        """
+        WRITE_REG messages updating a device whose output registers hold written, starting at GLOBAL__BRIGHTNESS
+
+        For when something else wrote to the device since the last flush. None is unknown.
+        """
+        self._written = list(written)
+        return self.flush()
+
+    def flush(self) -> list[Frame]:
+        """
+        WRITE_REG messages updating the device with the registers that changed since the last flush
+        """
+        values = self.registers()
+        registers = dict(zip(self.OUTPUTS, values))
+        dirty = [address for address, value, written in zip(self.OUTPUTS, values, self._written) if value != written]
+        self._written = values
+        if dirty and dirty[0] == Address.GLOBAL__BRIGHTNESS:
+            self._brightness_written = True
+        return write_frames(registers, dirty)
+
+
+class Snapshots:
+    """
+    Most recently used surface snapshots
+
+    Usage:
+        snapshots = Snapshots()
+        snapshots[preset] = surface.snapshot()
+        ...
+        for frame in surface.restore(snapshots[preset]):
+            tc.send(frame)
+    """
+    maxsize: int
+    _snapshots: OrderedDict[Hashable, bytes]
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._snapshots = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._snapshots
+
+    def __getitem__(self, key: Hashable) -> bytes:
+        self._snapshots.move_to_end(key)
+        return self._snapshots[key]
+
+    def __setitem__(self, key: Hashable, snapshot: bytes):
+        if len(snapshot) != Surface.SNAPSHOT.size:
+            raise ValueError(f"snapshots are {Surface.SNAPSHOT.size} bytes long")
+        self._snapshots[key] = snapshot
+        self._snapshots.move_to_end(key)
+        if len(self._snapshots) > self.maxsize:
+            self._snapshots.popitem(last=False)
+
+    def get(self, key: Hashable, default: bytes | None = None) -> bytes | None:
+        if key not in self._snapshots:
+            return default
+        return self[key]
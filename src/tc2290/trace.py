@@ -0,0 +1,155 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Binary packet trace
+
+Raw reports with their monotonic timestamp and direction, in a preallocated ring file.
+Cheap enough to be always on. Render with src/re_tools/render_trace.py.
+
+File format (Little endian):
+    Header: magic, version, record size, capacity, wall clock and monotonic clock at creation (ns), records written
+    Records: monotonic clock (ns), direction, length, padding, report
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from enum import IntEnum
+from typing import Iterator, NamedTuple, Protocol
+
+from tc2290.protocol import Message
+
+MAGIC = b'TC2290TR'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQQQ')
+RECORD = struct.Struct('<QBB6x')
+RECORD_SIZE = RECORD.size + Message.MAX_SIZE
+_SEQUENCE = struct.Struct('<Q')
+_SEQUENCE_OFFSET = HEADER.size - _SEQUENCE.size
+
+
+class Direction(IntEnum):
+    OUT = 0  # Host -> Device
+    IN = 1  # Device -> Host
+
+
+class Recorder(Protocol):
+    """
+    What TC2290 needs to record its traffic. Implemented by Trace and PcapngRecorder.
+    """
+
+    def record(self, direction: Direction, data) -> None:
+        ...
+
+
+class TraceRecord(NamedTuple):
+    timestamp: float  # Seconds since epoch
+    direction: Direction
+    data: bytes
+
+
+class TraceError(ValueError):
+    pass
+
+
+class Trace:
+    """
+    Writes reports to a ring file
+
+    The file is created at full size and memory mapped. Recording copies the report in place without any formatting.
+    Once full, the oldest reports are overwritten.
+    """
+    path: str
+    capacity: int
+
+    _file: mmap.mmap | None
+    _sequence: int
+    _lock: threading.Lock
+    _clock = staticmethod(time.monotonic_ns)
+
+    def __init__(self, path: str | os.PathLike, capacity: int = 65536) -> None:
+        """
+        :param capacity: Number of reports kept. The file takes capacity × 80 bytes.
+        """
+        self.path = os.fspath(path)
+        self.capacity = capacity
+        self._sequence = 0
+        self._lock = threading.Lock()
+        size = HEADER.size + capacity * RECORD_SIZE
+        with open(self.path, 'w+b') as f:
+            f.truncate(size)
+            self._file = mmap.mmap(f.fileno(), size)
+        HEADER.pack_into(
+            self._file, 0, MAGIC, VERSION, RECORD_SIZE, capacity, time.time_ns(), self._clock(), 0,
+        )
+
+    def __enter__(self) -> 'Trace':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def record(self, direction: Direction, data) -> None:
+        """
+        :param data: Report. Anything bytes() accepts. Truncated to 64 bytes.
+        """
+        timestamp = self._clock()
+        if not isinstance(data, (bytes, bytearray, memoryview)):  # hidapi returns lists
+            data = bytes(data)
+        length = min(len(data), Message.MAX_SIZE)
+        with self._lock:
+            buffer = self._file
+            if buffer is None:
+                return
+            offset = HEADER.size + (self._sequence % self.capacity) * RECORD_SIZE
+            RECORD.pack_into(buffer, offset, timestamp, direction, length)
+            start = offset + RECORD.size
+            buffer[start:start + length] = data[:length]
+            self._sequence += 1
+            _SEQUENCE.pack_into(buffer, _SEQUENCE_OFFSET, self._sequence)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._file.close()
+                self._file = None
+
+
+def records(buffer) -> Iterator[TraceRecord]:
+    """
+    Reports of a trace buffer, oldest first
+    """
+    if len(buffer) < HEADER.size:
+        raise TraceError("truncated header")
+    magic, version, record_size, capacity, wall, monotonic, sequence = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise TraceError("not a TC2290 trace")
+    if version != VERSION or record_size != RECORD_SIZE:
+        raise TraceError(f"unsupported trace version {version}")
+    if len(buffer) < HEADER.size + capacity * record_size:
+        raise TraceError("truncated records")
+    first = max(sequence - capacity, 0)
+    for index in range(first, sequence):
+        offset = HEADER.size + (index % capacity) * record_size
+        timestamp, direction, length = RECORD.unpack_from(buffer, offset)
+        start = offset + RECORD.size
+        yield TraceRecord(
+            timestamp=(wall + timestamp - monotonic) / 1e9,
+            direction=Direction(direction),
+            data=bytes(buffer[start:start + length]),
+        )
+
+
+def read(path: str | os.PathLike) -> Iterator[TraceRecord]:
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        yield from records(buffer)
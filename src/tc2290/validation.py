@@ -0,0 +1,123 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Replay validation
+
+Compares the reports read during a replay to the captured ones in bulk.
+"""
+from dataclasses import dataclass, field
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from tc2290.protocol import Command, Message
+
+# Bytes that change from one run to the other, by command byte of the expected report
+VOLATILE = np.zeros((256, Message.MAX_SIZE), dtype=bool)
+VOLATILE[Command.REPLY, 12:] = True  # Button reports: 52 bytes of gibberish
+VOLATILE[Command.INSTANCE_START, 8:52] = True  # Instance name
+VOLATILE[Command.INSTANCE_FOCUS, 8:52] = True  # Instance name
+
+
+@dataclass
+class ValidationSummary:
+    packets: int = 0
+    mismatched: int = 0  # Packets with at least one unexpected byte
+    missing: int = 0  # Packets read shorter than expected
+    offsets: dict[int, int] = field(default_factory=dict)  # Number of packets diverging at each offset
+    labels: list[str] = field(default_factory=list)  # Mismatched packets
+
+    def __str__(self) -> str:
+        lines = [f"{self.mismatched}/{self.packets} packets diverge, {self.missing} short or missing"]
+        for offset, count in sorted(self.offsets.items()):
+            lines.append(f"  byte {offset:2d}: {count}")
+        if self.labels:
+            lines.append(f"  first: {', '.join(self.labels[:10])}")
+        return '\n'.join(lines)
+
+
+class Validator:
+    """
+    Collects expected and actual reports then compares all of them at once
+
+    Reports are stored as rows of (N, 64) arrays.
+    """
+    _expected: np.ndarray
+    _actual: np.ndarray
+    _lengths: np.ndarray  # Expected and actual lengths
+    _labels: list[str]
+    _count: int
+    mask: np.ndarray
+
+    def __init__(self, capacity: int = 1024, mask: Sequence[bool] | np.ndarray | None = None) -> None:
+        """
+        :param capacity: Initial number of reports. Grows as needed.
+        :param mask: Additional bytes to ignore in every report
+        """
+        self._expected = np.zeros((capacity, Message.MAX_SIZE), dtype=np.uint8)
+        self._actual = np.zeros((capacity, Message.MAX_SIZE), dtype=np.uint8)
+        self._lengths = np.zeros((capacity, 2), dtype=np.uint8)
+        self._labels = []
+        self._count = 0
+        self.mask = np.zeros(Message.MAX_SIZE, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self._expected)
+        for name in ('_expected', '_actual', '_lengths'):
+            old = getattr(self, name)
+            new = np.zeros((capacity, old.shape[1]), dtype=old.dtype)
+            new[:self._count] = old[:self._count]
+            setattr(self, name, new)
+
+    def add(self, expected: bytes | Sequence[int], actual: bytes | Sequence[int] | None, label: str = '') -> None:
+        if self._count == len(self._expected):
+            self._grow()
+        row = self._count
+        expected = bytes(expected[:Message.MAX_SIZE])
+        actual = bytes(actual[:Message.MAX_SIZE]) if actual else b''
+        self._expected[row, :len(expected)] = np.frombuffer(expected, dtype=np.uint8)
+        self._actual[row, :len(actual)] = np.frombuffer(actual, dtype=np.uint8)
+        self._lengths[row] = len(expected), len(actual)
+        self._labels.append(label or f"packet {row}")
+        self._count += 1
+
+    def extend(self, expected: Iterable[bytes | Sequence[int]], actual: Iterable[bytes | Sequence[int] | None]) -> None:
+        actual = iter(actual)
+        for expected_report in expected:
+            self.add(expected_report, next(actual, None))
+
+    def summary(self) -> ValidationSummary:
+        count = self._count
+        expected = self._expected[:count]
+        actual = self._actual[:count]
+        lengths = self._lengths[:count]
+
+        ignored = VOLATILE[expected[:, 0]] | self.mask
+        read = np.arange(Message.MAX_SIZE) < lengths[:, 1:]  # Missing bytes only count as short packets
+        diverging = (expected != actual) & ~ignored & read
+        short = lengths[:, 1] < lengths[:, 0]
+        mismatched = diverging.any(axis=1) | short
+        per_offset = diverging.sum(axis=0)
+
+        return ValidationSummary(
+            packets=count,
+            mismatched=int(mismatched.sum()),
+            missing=int(short.sum()),
+            offsets={int(offset): int(per_offset[offset]) for offset in np.flatnonzero(per_offset)},
+            labels=[self._labels[row] for row in np.flatnonzero(mismatched)],
+        )
+
+
+def validate(
+        expected: Iterable[bytes | Sequence[int]],
+        actual: Iterable[bytes | Sequence[int] | None],
+) -> ValidationSummary:
+    validator = Validator()
+    validator.extend(expected, actual)
+    return validator.summary()
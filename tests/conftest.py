@@ -0,0 +1,17 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Hardware-free tests
+
+Run from the repository root with: python -m pytest
+"""
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+CAPTURES = ROOT / 'capture'
+
+sys.path.insert(0, str(ROOT / 'src'))
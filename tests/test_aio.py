@@ -0,0 +1,51 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT asyncio transport over the simulated device
+"""
+import asyncio
+import threading
+
+from tc2290.aio import AsyncTC2290
+from tc2290.protocol import Address, ButtonEvent
+from tc2290.simulator import SimulatedTC2290
+
+
+class ClosingTC2290(SimulatedTC2290):
+    closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_releases_everything() -> None:
+    device = ClosingTC2290()
+    callback = []
+
+    async def main() -> None:
+        async with AsyncTC2290(transport=device, event_callback=callback.append) as dev:
+            assert await dev.fw_ver() == SimulatedTC2290.VERSION.decode()
+            device.click(Address.DELAY__UP)
+            event = await asyncio.wait_for(anext(dev.events()), 1.0)
+            assert isinstance(event, ButtonEvent)
+
+    asyncio.run(main())
+    assert device.closed
+    assert [type(event) for event in callback][-2:] == [ButtonEvent, ButtonEvent]
+    threads = [thread for thread in threading.enumerate() if thread.name.startswith('TC2290')]
+    for thread in threads:
+        thread.join(1.0)  # The writer exits once its last job is done
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_stop_without_start() -> None:
+    device = ClosingTC2290()
+
+    async def main() -> None:
+        await AsyncTC2290(transport=device).stop()
+
+    asyncio.run(main())
+    assert device.closed
@@ -0,0 +1,50 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Several simulated devices
+"""
+import pytest
+
+from tc2290.manager import DeviceInfo, DeviceManager
+from tc2290.simulator import SimulatedTC2290
+
+
+class GoneTC2290(SimulatedTC2290):
+    def close(self) -> None:
+        raise OSError("device gone")
+
+
+def test_close_with_unplugged_devices() -> None:
+    devices = {b'1': GoneTC2290(), b'2': SimulatedTC2290(), b'3': SimulatedTC2290()}
+    manager = DeviceManager(opener=devices.__getitem__)
+    for path in devices:
+        manager.open(DeviceInfo(path=path, product_id=0x0071, serial_number=path.decode()))
+    assert [device.instance_name for device in devices.values()] == [b'TC 2290 1', b'TC 2290 2', b'TC 2290 3']
+    manager.start()
+    devices[b'1'].unplug()
+    devices[b'2'].unplug()
+    manager.close()
+    assert len(manager) == 0
+    assert devices[b'3'].instance_name is None  # Unregistered
+
+
+class UnwritableTC2290(SimulatedTC2290):
+    closed = False
+
+    def write(self, buff) -> int:
+        raise OSError("write error")
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_failed_registration_closes_the_device() -> None:
+    device = UnwritableTC2290()
+    manager = DeviceManager(opener=lambda path: device)
+    with pytest.raises(OSError):
+        manager.open(DeviceInfo(path=b'1', product_id=0x0071, serial_number='1'))
+    assert device.closed
+    assert len(manager) == 0
@@ -0,0 +1,40 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Level meters
+"""
+import numpy as np
+
+from tc2290.meters import FLOOR, Ballistics, MeterEngine, bitmap, block_levels
+from tc2290.protocol import Address
+from tc2290.surface import Surface
+
+
+def test_empty_is_silence() -> None:
+    surface = Surface()
+    engine = MeterEngine(surface.meters)
+    assert engine.update([np.array([]), [], np.zeros((0,)), None]) == []
+    assert engine.update(np.zeros((4, 0))) == []
+    assert list(block_levels(b'')) == [FLOOR, FLOOR]
+    assert engine.update_pcm(b'', b'') == []
+
+
+def test_first_update_rises_with_attack() -> None:
+    surface = Surface()
+    engine = MeterEngine(surface.meters, ballistics=Ballistics(attack=0.3, hold=0))
+    assert engine.update([-3.0, None, None, None]) == [Address.INPUT__LEDS_L]
+    assert surface.meters.input.left.value == bitmap(-3.0)
+
+
+def test_attack_and_release() -> None:
+    surface = Surface()
+    engine = MeterEngine(surface.meters, ballistics=Ballistics(attack=0.3, release=20.0, hold=0))
+    engine.update([-60.0] * 4, dt=0.0)
+    engine.update([0.0] * 4, dt=0.1)
+    level = engine.meters[0].level
+    assert -60.0 < level < 0.0
+    engine.update([FLOOR] * 4, dt=0.5)
+    assert engine.meters[0].level == level - 10.0
@@ -0,0 +1,62 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Metrics
+"""
+import threading
+
+from tc2290 import TC2290
+from tc2290.metrics import Metrics
+from tc2290.protocol import Address, Command, Frame
+from tc2290.simulator import SimulatedTC2290
+
+
+def test_no_write_lost_across_threads() -> None:
+    metrics = Metrics(sample=1)
+    tc = TC2290(transport=SimulatedTC2290(), metrics=metrics)
+    frame = Frame(Command.INSTANCE_FOCUS)
+
+    def send() -> None:
+        for _ in range(1000):
+            tc.send(frame)
+
+    threads = [threading.Thread(target=send) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.counters()['reports_written'] == 8000
+    assert metrics.hid_write.count == 8000
+    assert sum(metrics.hid_write.buckets) == 8000
+    tc.close()
+
+
+def test_sampled_timings() -> None:
+    metrics = Metrics(sample=4)
+    device = SimulatedTC2290(seed=0)
+    tc = TC2290(event_callback=lambda event: None, transport=device, metrics=metrics)
+    for _ in range(4):
+        device.click(Address.DELAY__UP)
+    for _ in range(100):
+        tc.poll()
+    counters = metrics.counters()
+    assert counters['polls'] == 100
+    assert counters['empty_polls'] == 92
+    assert counters['reports_read'] == 8
+    assert metrics.hid_read.count == 25
+    assert metrics.decode.count == 2
+    tc.close()
+
+
+def test_disabled_by_default() -> None:
+    tc = TC2290(transport=SimulatedTC2290())
+    tc.surface.invalidate()
+    tc.flush()
+    tc.poll()
+    assert not tc.metrics.enabled
+    assert set(tc.metrics.counters().values()) == {0}
+    assert tc.metrics.hid_write.count == 0
+    tc.close()
@@ -0,0 +1,70 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Decoder against the captured reports
+"""
+import pytest
+from conftest import CAPTURES
+
+from re_tools import pcapng
+from tc2290.protocol import (
+    Address, ButtonEvent, Command, Decoder, FocusEvent, InstanceEvent, RegisterEvent, ReplyEvent,
+)
+from tc2290.simulator import SimulatedTC2290
+
+CAPTURE = CAPTURES / '2022-11-19 TC2290-DT.pcapng'
+
+# Event class by command, as captured
+EXPECTED = {
+    Command.INSTANCE_START: InstanceEvent,
+    Command.INSTANCE_FOCUS: FocusEvent,
+    Command.READ_REG: RegisterEvent,
+}
+
+
+@pytest.fixture(scope='module')
+def received() -> list[bytes]:
+    return [record.data for record in pcapng.read(str(CAPTURE)) if record.direction is pcapng.Direction.IN]
+
+
+def test_captured_events(received: list[bytes]) -> None:
+    assert received
+    for data, event in zip(received, Decoder().feed(received)):
+        assert isinstance(event, EXPECTED[data[0]]), data.hex(' ')
+
+
+def test_captured_instance_echo(received: list[bytes]) -> None:
+    events = [event for event in Decoder().feed(received) if isinstance(event, InstanceEvent)]
+    assert {event.name for event in events} == {'Unnamed (Instance #1)'}
+    assert {event.state for event in events} == {0x02}
+
+
+def test_captured_register_replies(received: list[bytes]) -> None:
+    events = [event for event in Decoder().feed(received) if isinstance(event, RegisterEvent)]
+    version = next(event for event in events if event.address == Address.VERSION)
+    assert version.payload.rstrip(b'\x00') == b'1.0.04 - 358'
+    assert all(len(event.payload) == event.data[1] for event in events)
+
+
+def test_button_toggles() -> None:
+    device = SimulatedTC2290(seed=0)
+    device.click(Address.DELAY__UP)
+    device.press(Address.KEYBOARD__ENTER)
+    events = list(Decoder().feed(device.read(64) for _ in range(3)))
+    assert all(isinstance(event, ButtonEvent) for event in events)
+    assert [(event.button, event.pressed) for event in events] == [
+        (Address.DELAY__UP, True),
+        (Address.DELAY__UP, False),
+        (Address.KEYBOARD__ENTER, True),
+    ]
+
+
+def test_reply_is_not_a_button() -> None:
+    decoder = Decoder()
+    reply = bytes.fromhex('0c04000001000000') + bytes((Address.DELAY__UP, 0, 0, 0)) + bytes(52)
+    assert isinstance(decoder.decode(reply), ReplyEvent)
+    button = bytes.fromhex('0c080000ffffffff') + bytes((Address.DELAY__UP, 0, 0, 0)) + bytes(52)
+    assert decoder.decode(button).pressed
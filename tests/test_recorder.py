@@ -0,0 +1,89 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT pcapng recording read back with the capture reader
+"""
+import struct
+import time
+
+from conftest import CAPTURES
+
+from re_tools import pcapng
+from tc2290 import TC2290
+from tc2290.protocol import Address, Command, Frame, Message
+from tc2290.recorder import ENDPOINT_IN, ENDPOINT_OUT, LINKTYPE_USBPCAP, PcapngRecorder
+from tc2290.simulator import SimulatedTC2290
+from tc2290.trace import Direction
+
+
+def test_round_trip(tmp_path) -> None:
+    path = tmp_path / 'session.pcapng'
+    device = SimulatedTC2290(seed=0)
+    start = time.time()
+    with PcapngRecorder(path) as recorder:
+        tc = TC2290(transport=device, trace=recorder)
+        sent = [
+            Frame(Command.INSTANCE_START, data=b'Test'),
+            Frame(Command.READ_REG, address=Address.VERSION, data=bytes(16)),
+        ]
+        for frame in sent:
+            tc.send(frame)
+        received = [tc.read() for _ in range(2)]
+        device.click(Address.DELAY__UP)
+        received += [tc.read() for _ in range(2)]
+        tc.close()
+    end = time.time()
+
+    records = list(pcapng.read(str(path)))
+    outs = [record for record in records if record.direction is pcapng.Direction.OUT]
+    ins = [record for record in records if record.direction is pcapng.Direction.IN]
+    # Unregistering the instance on close is recorded too
+    assert [record.data for record in outs[:2]] == [bytes(frame).ljust(Message.MAX_SIZE, b'\x00') for frame in sent]
+    assert [record.data for record in ins] == [bytes(data) for data in received]
+    assert {record.endpoint for record in outs} == {ENDPOINT_OUT}
+    assert {record.endpoint for record in ins} == {ENDPOINT_IN}
+    assert all(start - 1e-3 <= record.timestamp <= end + 1e-3 for record in records)
+    assert [record.timestamp for record in records] == sorted(record.timestamp for record in records)
+
+
+def test_link_type(tmp_path) -> None:
+    path = tmp_path / 'empty.pcapng'
+    PcapngRecorder(path).close()
+    data = path.read_bytes()
+    section_length = struct.unpack_from('<I', data, 4)[0]
+    assert struct.unpack_from('<H', data, section_length + 8)[0] == LINKTYPE_USBPCAP
+    assert list(pcapng.read(str(path))) == []
+
+
+def test_capture_rewritten(tmp_path) -> None:
+    """
+    A capture recorded again reads back the same
+    """
+    captured = list(pcapng.read(str(CAPTURES / 'ORIG.pcapng')))
+    path = tmp_path / 'copy.pcapng'
+    with PcapngRecorder(path) as recorder:
+        for record in captured:
+            recorder.record(Direction[record.direction.name], record.data)
+    copied = list(pcapng.read(str(path)))
+    assert [(record.direction, record.data) for record in copied] == [
+        (record.direction, record.data) for record in captured
+    ]
+
+
+def test_record_after_close(tmp_path) -> None:
+    path = tmp_path / 'closed.pcapng'
+    recorder = PcapngRecorder(path)
+    tc = TC2290(transport=SimulatedTC2290(), trace=recorder)
+    tc.send(Frame(Command.INSTANCE_FOCUS))
+    recorder.close()
+    size = path.stat().st_size
+    for _ in range(100):
+        tc.send(Frame(Command.INSTANCE_FOCUS))
+    recorder.flush()
+    assert recorder._pending == []
+    assert path.stat().st_size == size
+    assert len(list(pcapng.read(str(path)))) == 1
+    tc.close()
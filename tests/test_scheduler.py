@@ -0,0 +1,44 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Register write scheduler
+"""
+import pytest
+
+from tc2290.protocol import Address
+from tc2290.scheduler import WriteScheduler
+
+
+def test_failed_message_is_queued_again() -> None:
+    sent = []
+
+    def send(frame) -> None:
+        if not sent:
+            sent.append(None)
+            raise OSError("write error")
+        sent.append(bytes(frame))
+
+    scheduler = WriteScheduler(send)
+    scheduler.write(Address.DELAY__DIGIT_1, 0x01)
+    with pytest.raises(OSError):
+        scheduler.drain()
+    assert scheduler.pending == 1
+    assert scheduler.drain() == 1
+    assert scheduler.pending == 0
+    scheduler.write(Address.DELAY__DIGIT_1, 0x01)  # Already written
+    assert scheduler.drain() == 0
+
+
+def test_drain_while_started() -> None:
+    scheduler = WriteScheduler(lambda frame: None)
+    scheduler.start()
+    try:
+        with pytest.raises(RuntimeError):
+            scheduler.drain()
+    finally:
+        scheduler.stop()
+    scheduler.write(Address.DELAY__DIGIT_1, 0x01)
+    assert scheduler.drain() == 1
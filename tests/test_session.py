@@ -0,0 +1,80 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Instances sharing the simulated device
+"""
+from tc2290 import TC2290
+from tc2290.protocol import Address, Command
+from tc2290.session import SessionMultiplexer
+from tc2290.simulator import SimulatedTC2290
+
+# As captured
+INSTANCE_START = bytes.fromhex(
+    '012d000001000000556e6e616d65642028496e7374616e636520233129000000000000000000000000000000000000000000000001'
+)
+
+
+def test_handshake_as_captured() -> None:
+    sent = []
+    multiplexer = SessionMultiplexer(lambda frame: sent.append(bytes(frame)))
+    first = multiplexer.open('Unnamed (Instance #1)')
+    second = multiplexer.open('Unnamed (Instance #2)')
+    second.focus()
+    first.close()
+    second.close()
+    handshake = [frame for frame in sent if frame[0] != Command.WRITE_REG]
+    assert handshake == [
+        INSTANCE_START,
+        bytes.fromhex('0d00000001000000'),
+        INSTANCE_START,  # The first instance's name again
+        bytes.fromhex('0d00000101000000'),
+        bytes.fromhex('0b00000001000000'),  # Once the last instance is closed
+    ]
+
+
+def test_registered_until_the_last_close() -> None:
+    device = SimulatedTC2290(seed=0)
+    tc = TC2290(transport=device)
+    multiplexer = SessionMultiplexer(tc.send)
+    first = multiplexer.open('A')
+    second = multiplexer.open('B')
+    assert device.instance_name == b'A'
+    first.close()
+    assert device.instance_name == b'A'
+    assert second.focused
+    second.close()
+    assert device.instance_name is None
+    assert multiplexer.focused is None
+    tc.close()
+
+
+def test_focus_writes_the_difference() -> None:
+    device = SimulatedTC2290(seed=0)
+    tc = TC2290(transport=device)
+    sent = []
+
+    def send(frame) -> None:
+        sent.append(bytes(frame))
+        tc.send(frame)
+
+    multiplexer = SessionMultiplexer(send)
+    a = multiplexer.open('A')
+    b = multiplexer.open('B')
+    a.surface.delay.display.from_str('120')
+    b.surface.delay.display.from_str('121')
+    assert a.flush()
+    assert not b.flush()
+    del sent[:]
+    b.focus()
+    writes = [frame for frame in sent if frame[0] == Command.WRITE_REG]
+    assert [(frame[1], frame[3]) for frame in writes] == [(0x04, Address.DELAY__DIGIT_1)]
+    assert device.register(Address.DELAY__DIGIT_1) == b.surface.registers()[Address.DELAY__DIGIT_1 - 0x4A]
+
+    # Brightness is still left alone after invalidation
+    multiplexer.invalidate()
+    a.focus()
+    assert all(frame[3] != Address.GLOBAL__BRIGHTNESS for frame in sent if frame[0] == Command.WRITE_REG)
+    tc.close()
@@ -0,0 +1,67 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT TC2290 over the simulated transport
+"""
+import pytest
+
+from tc2290 import TC2290
+from tc2290.protocol import Address, ButtonEvent, Command, Frame, Header
+from tc2290.simulator import SimulatedTC2290
+
+
+@pytest.fixture
+def device() -> SimulatedTC2290:
+    return SimulatedTC2290(seed=0)
+
+
+def test_firmware_version(device) -> None:
+    tc = TC2290(transport=device)
+    assert tc.fw_ver() == SimulatedTC2290.VERSION.decode()
+    tc.close()
+
+
+def test_instance_registration(device) -> None:
+    tc = TC2290(transport=device)
+    tc.instance('Unnamed (Instance #1)')
+    assert device.instance_name == b'Unnamed (Instance #1)'
+    echo = bytes(tc.read(timeout_ms=100))
+    assert echo[0] == Command.INSTANCE_START
+    assert echo[52] == 0x02
+    tc.close()
+    assert device.instance_name is None
+
+
+def test_write_reg(device) -> None:
+    tc = TC2290(transport=device)
+    tc.send(Frame.from_words(Command.WRITE_REG, Address.DELAY__DIGIT_1, [0x12345678]))
+    assert device.register(Address.DELAY__DIGIT_1) == 0x12345678
+    tc.send(Frame(Command.READ_REG, address=Address.DELAY__DIGIT_1, data=b'\x00' * 4))
+    reply = bytes(tc.read(timeout_ms=100))
+    assert reply[Header.SIZE:Header.SIZE + 4] == (0x12345678).to_bytes(4, 'little')
+    tc.close()
+
+
+def test_buttons(device) -> None:
+    events = []
+    tc = TC2290(event_callback=events.append, transport=device)
+    device.click(Address.DELAY__UP)
+    tc.poll()
+    tc.poll()
+    tc.poll()  # Nothing left
+    assert all(isinstance(event, ButtonEvent) for event in events)
+    assert [(event.button, event.pressed) for event in events] == [(Address.DELAY__UP, True), (Address.DELAY__UP, False)]
+    tc.close()
+
+
+def test_unplug(device) -> None:
+    tc = TC2290(transport=device)
+    device.unplug()
+    with pytest.raises(OSError):
+        tc.read()
+    with pytest.raises(OSError):
+        tc.send(Frame(Command.INSTANCE_FOCUS))
+    tc.close()  # Tolerates the unplugged device
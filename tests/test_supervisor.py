@@ -0,0 +1,95 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Reconnection after an unplug of the simulated device
+"""
+import time
+
+import pytest
+
+from tc2290.protocol import Address
+from tc2290.simulator import SimulatedTC2290
+from tc2290.supervisor import Supervisor
+from tc2290.surface import Surface
+
+TIMEOUT = 5.0
+
+
+class Plug:
+    """
+    A new simulated device on each connection, as after a power cycle
+    """
+
+    def __init__(self) -> None:
+        self.devices: list[SimulatedTC2290] = []
+        self.available = True
+
+    def connect(self) -> SimulatedTC2290:
+        if not self.available:
+            raise OSError("no device found")
+        device = SimulatedTC2290(seed=len(self.devices))
+        self.devices.append(device)
+        return device
+
+
+def wait(condition, timeout: float = TIMEOUT) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def shown(device: SimulatedTC2290) -> list[int]:
+    return [device.register(address) for address in Surface.OUTPUTS[1:]]
+
+
+@pytest.fixture
+def plug() -> Plug:
+    return Plug()
+
+
+@pytest.fixture
+def supervisor(plug: Plug) -> Supervisor:
+    supervisor = Supervisor(instance_name='Test', connect=plug.connect, backoff=(0.01, 0.05))
+    yield supervisor
+    supervisor.stop()
+
+
+def test_reconnect(plug: Plug, supervisor: Supervisor) -> None:
+    supervisor.surface.delay.display.from_str('120')
+    supervisor.start()
+    assert supervisor.wait_connected(TIMEOUT)
+    assert supervisor.flush()
+    first = plug.devices[0]
+    assert first.instance_name == b'Test'
+    assert shown(first) == supervisor.surface.registers()[1:]
+
+    plug.available = False
+    first.unplug()
+    assert wait(lambda: not supervisor.connected)
+    # Changes made while disconnected are kept
+    supervisor.surface.feedback.display.from_str('42')
+    assert not supervisor.flush()
+
+    plug.available = True
+    assert wait(lambda: supervisor.connections == 2)
+    assert supervisor.wait_connected(TIMEOUT)
+    second = plug.devices[-1]
+    assert second is not first
+    assert second.instance_name == b'Test'
+    assert shown(second) == supervisor.surface.registers()[1:]
+    # Brightness was never set so it is left alone
+    assert second.register(Address.GLOBAL__BRIGHTNESS) == 0
+
+
+def test_stop_while_disconnected(plug: Plug, supervisor: Supervisor) -> None:
+    plug.available = False
+    supervisor.start()
+    assert not supervisor.wait_connected(0.1)
+    supervisor.stop()
+    assert supervisor.tc is None
@@ -0,0 +1,95 @@
+# This Python file uses the following encoding: utf-8
+#
+# SPDX-FileCopyrightText: 2022 Raphaël Doursenaud <rdoursenaud@free.fr>
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+TC2290-DT Surface flush against the simulated device
+"""
+import pytest
+
+from tc2290 import TC2290
+from tc2290.protocol import Address, BLOCKS, Chunk, Header
+from tc2290.simulator import SimulatedTC2290
+from tc2290.surface import Surface
+
+
+@pytest.fixture
+def device() -> SimulatedTC2290:
+    return SimulatedTC2290(seed=0)
+
+
+@pytest.fixture
+def tc(device: SimulatedTC2290) -> TC2290:
+    tc = TC2290(transport=device)
+    yield tc
+    tc.close()
+
+
+def light(surface: Surface) -> None:
+    surface.meters.input.left.value = 0x7FF
+    surface.meters.output.right.value = 0x00F
+    surface.modulation.display.from_str('42')
+    surface.modulation.speed.state = True
+    surface.pan_dyn.dyn.reverse.state = True
+    surface.delay.display.from_str('120')
+    surface.feedback.display.from_str('99')
+    surface.preset_spec.display.from_str('07')
+    surface.preset_spec.delay_on.state = True
+
+
+def span(frame) -> range:
+    return range(frame[3], frame[3] + (len(frame) - Header.SIZE) // Chunk.SIZE)
+
+
+def block(address: int) -> int | None:
+    return next((i for i, b in enumerate(BLOCKS) if address in b), None)
+
+
+def test_flush_round_trip(tc: TC2290, device: SimulatedTC2290) -> None:
+    light(tc.surface)
+    tc.flush()
+    for address, value in zip(Surface.OUTPUTS[1:], tc.surface.registers()[1:]):
+        assert device.register(address) == value, Address(address).name
+    assert not tc.surface.dirty()
+    assert not tc.surface.flush()
+
+
+def test_flush_leaves_brightness_alone(tc: TC2290, device: SimulatedTC2290) -> None:
+    device.registers[Address.GLOBAL__BRIGHTNESS * device.REGISTER_SIZE] = 0x0F
+    light(tc.surface)
+    tc.flush()
+    tc.surface.invalidate()
+    tc.flush()
+    assert device.register(Address.GLOBAL__BRIGHTNESS) == 0x0F
+
+
+def test_flush_brightness_once_set(tc: TC2290, device: SimulatedTC2290) -> None:
+    tc.surface.brightness.strength = 0x0F
+    tc.flush()
+    device.registers[Address.GLOBAL__BRIGHTNESS * device.REGISTER_SIZE] = 0x00  # Power cycled
+    tc.surface.invalidate()
+    tc.flush()
+    assert device.register(Address.GLOBAL__BRIGHTNESS) == tc.surface.brightness.value
+
+
+def test_flush_never_crosses_blocks() -> None:
+    surface = Surface()
+    light(surface)
+    surface.invalidate()
+    for frame in surface.flush():
+        addresses = span(frame)
+        assert len({block(address) for address in addresses}) == 1, bytes(frame).hex(' ')
+
+
+def test_flush_single_register(tc: TC2290, device: SimulatedTC2290) -> None:
+    light(tc.surface)
+    tc.flush()
+    tc.surface.delay.sync.state = True
+    frames = tc.surface.flush()
+    assert [list(span(frame)) for frame in frames] == [[Address.DELAY__LED_SYNC]]
+    for frame in frames:
+        tc.send(frame)
+    # Sized messages don't reset the elements that follow in the block
+    for address, value in zip(Surface.OUTPUTS[1:], tc.surface.registers()[1:]):
+        assert device.register(address) == value, Address(address).name